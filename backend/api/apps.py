@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
+        from .exports import register_fonts
+        register_fonts()
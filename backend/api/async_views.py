@@ -0,0 +1,193 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from recipes.models import Recipe
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import cache
+from .membership import get_memberships
+from .mixins import catalogue_response
+from .serializers import RecipeReadSerializer, SubscribeSerializer
+from .utils import get_recipes_limit
+from .views import (IngredientViewSet, RecipeViewSet, SubscriptionsViews,
+                    TagViewSet, recipe_previews_queryset)
+
+PAGE_QUERY_PARAM = 'page'
+
+
+async def authenticate(request):
+    '''Пользователь по заголовку Authorization: Token <ключ>.
+
+    None означает, что запрос должна обработать синхронная DRF-вьюха,
+    которая и ответит 401 с привычным текстом ошибки.
+    '''
+    header = request.headers.get('Authorization')
+    if not header:
+        return AnonymousUser()
+    parts = header.split()
+    if len(parts) != 2 or parts[0].lower() != 'token':
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=parts[1])
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+    return token.user
+
+
+def accepts_json(request):
+    '''Браузеру отдаётся browsable API, его рисует только DRF.'''
+    return 'text/html' not in request.headers.get('Accept', '')
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status,
+                        content_type='application/json')
+
+
+def page_number(request, allowed=()):
+    '''Номер страницы или None, если в запросе есть другие параметры.'''
+    if set(request.GET) - {PAGE_QUERY_PARAM, *allowed}:
+        return None
+    value = request.GET.get(PAGE_QUERY_PARAM, '1')
+    if not value.isdigit() or int(value) < 1:
+        return None
+    return int(value)
+
+
+def paginated(request, page, count, results):
+    '''Тело ответа в формате PageNumberPagination.'''
+    url = request.build_absolute_uri()
+    next_link = previous_link = None
+    if page * settings.REST_FRAMEWORK['PAGE_SIZE'] < count:
+        next_link = replace_query_param(url, PAGE_QUERY_PARAM, page + 1)
+    if page == 2:
+        previous_link = remove_query_param(url, PAGE_QUERY_PARAM)
+    elif page > 2:
+        previous_link = replace_query_param(url, PAGE_QUERY_PARAM, page - 1)
+    return {'count': count, 'next': next_link,
+            'previous': previous_link, 'results': results}
+
+
+async def get_page(request, queryset, page):
+    '''Страница queryset или None для несуществующей страницы.'''
+    size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    count = await queryset.acount()
+    if page > 1 and (page - 1) * size >= count:
+        return None, count
+    offset = (page - 1) * size
+    return [item async for item in queryset[offset:offset + size]], count
+
+
+async def load_memberships(request, kinds):
+    await sync_to_async(get_memberships(request).load)(kinds)
+
+
+def async_read_view(handler, fallback):
+    '''Async-вьюха для чтения с синхронной DRF-вьюхой в запасе.
+
+    Запись, фильтры, курсоры и всё, что handler не обслуживает (он
+    возвращает None), уходит в fallback, поэтому ответы совпадают с
+    синхронным режимом.
+    '''
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET' and accepts_json(request):
+            user = await authenticate(request)
+            if user is not None:
+                request.user = user
+                response = await handler(request, *args, **kwargs)
+                if response is not None:
+                    return response
+        return await sync_to_async(fallback)(request, *args, **kwargs)
+    # CSRF проверяет fallback через SessionAuthentication, как и DRF. Флаг
+    # копируется, потому что csrf_exempt в Django 4.2 оборачивает только
+    # синхронные функции.
+    view.csrf_exempt = getattr(fallback, 'csrf_exempt', False)
+    return view
+
+
+async def recipe_list(request):
+    page = page_number(request)
+    if page is None:
+        return None
+    recipes, count = await get_page(
+        request, Recipe.objects.select_related('document'), page)
+    if recipes is None or not all(
+            hasattr(recipe, 'document') for recipe in recipes):
+        return None
+    await load_memberships(request, ('favourites', 'shopping_list',
+                                     'follows'))
+    serializer = RecipeReadSerializer(recipes, many=True,
+                                      context={'request': request})
+    return json_response(paginated(request, page, count, serializer.data))
+
+
+async def recipe_detail(request, pk):
+    if request.GET:
+        return None
+    try:
+        recipe = await Recipe.objects.select_related('document').aget(pk=pk)
+    except Recipe.DoesNotExist:
+        return None
+    if not hasattr(recipe, 'document'):
+        return None
+    await load_memberships(request, ('favourites', 'shopping_list',
+                                     'follows'))
+    return json_response(RecipeReadSerializer(
+        recipe, context={'request': request}).data)
+
+
+def catalogue_list(name):
+    '''Список справочника из кэша; при промахе его заполнит DRF-вьюха.'''
+    async def handler(request):
+        query = request.META.get('QUERY_STRING', '')
+        version = await sync_to_async(cache.get_catalogue_version)(name)
+        cached = await sync_to_async(cache.get_catalogue_response)(
+            name, version, query)
+        if cached is None:
+            return None
+        return catalogue_response(request, cached)
+    return handler
+
+
+async def subscriptions(request):
+    if request.user.is_anonymous:
+        return None
+    page = page_number(request, allowed=('recipes_limit', 'limit'))
+    if page is None:
+        return None
+    follows, count = await get_page(
+        request, request.user.follower.select_related('author'), page)
+    if follows is None:
+        return None
+    previews = defaultdict(list)
+    async for recipe in recipe_previews_queryset(
+            [follow.author_id for follow in follows],
+            get_recipes_limit(request)):
+        previews[recipe.author_id].append(recipe)
+    await load_memberships(request, ('follows',))
+    serializer = SubscribeSerializer(
+        follows, many=True,
+        context={'request': request, 'recipes': previews})
+    return json_response(paginated(request, page, count, serializer.data))
+
+
+recipe_list_view = async_read_view(recipe_list, RecipeViewSet.as_view(
+    {'get': 'list', 'post': 'create'}, basename='recipes', detail=False))
+recipe_detail_view = async_read_view(recipe_detail, RecipeViewSet.as_view(
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+     'delete': 'destroy'}, basename='recipes', detail=True))
+tag_list_view = async_read_view(catalogue_list('tags'), TagViewSet.as_view(
+    {'get': 'list', 'post': 'create'}, basename='tags', detail=False))
+ingredient_list_view = async_read_view(
+    catalogue_list('ingredients'), IngredientViewSet.as_view(
+        {'get': 'list', 'post': 'create'},
+        basename='ingredients', detail=False))
+subscriptions_view = async_read_view(
+    subscriptions, SubscriptionsViews.as_view())
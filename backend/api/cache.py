@@ -0,0 +1,124 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import quote_etag
+
+SHOPPING_CART_PREFIX = 'shopping_cart'
+HITS_KEY = f'{SHOPPING_CART_PREFIX}:hits'
+MISSES_KEY = f'{SHOPPING_CART_PREFIX}:misses'
+
+
+def get_cache():
+    return caches[settings.SHOPPING_CART_CACHE]
+
+
+def version_key(user_id):
+    return f'{SHOPPING_CART_PREFIX}:{user_id}:version'
+
+
+def document_key(user_id, version, format):
+    return f'{SHOPPING_CART_PREFIX}:{user_id}:{version}:{format}'
+
+
+def incr(key):
+    '''Атомарное увеличение счётчика, создающее его при отсутствии.'''
+    backend = get_cache()
+    backend.add(key, 0, timeout=None)
+    try:
+        return backend.incr(key)
+    except ValueError:
+        backend.set(key, 1, timeout=None)
+        return 1
+
+
+def new_version():
+    '''Время в наносекундах: версия не повторяется и после вытеснения
+    ключа из кэша, поэтому старый ETag не совпадёт с новым списком.'''
+    return time.time_ns()
+
+
+def get_version(user_id):
+    '''Текущая версия списка покупок пользователя.
+
+    Версия входит в ключ документа, поэтому запрос, начавший рендеринг
+    до изменения списка, сохранит документ под устаревшим ключом, и его
+    никто не прочитает.
+    '''
+    return get_cache().get_or_set(
+        version_key(user_id), new_version(), timeout=None)
+
+
+def document_etag(user_id, version, format):
+    '''ETag документа известен до рендеринга: версия меняется при каждом
+    изменении списка и не повторяется.'''
+    return quote_etag(f'{user_id}-{version}-{format}')
+
+
+def get_document(user_id, version, format):
+    '''Готовый документ (etag, содержимое) или None.'''
+    document = get_cache().get(document_key(user_id, version, format))
+    incr(MISSES_KEY if document is None else HITS_KEY)
+    return document
+
+
+def set_document(user_id, version, format, document):
+    get_cache().set(document_key(user_id, version, format), document)
+
+
+def invalidate(user_ids):
+    '''Сброс документов пользователей сменой версии их списков.'''
+    version = new_version()
+    get_cache().set_many({version_key(user_id): version
+                          for user_id in set(user_ids)}, timeout=None)
+
+
+def get_stats():
+    '''Попадания и промахи кэша документов списка покупок.'''
+    counters = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+CATALOGUE_PREFIX = 'catalogue'
+
+
+def get_catalogue_cache():
+    return caches[settings.CATALOGUE_CACHE]
+
+
+def catalogue_version_key(name):
+    return f'{CATALOGUE_PREFIX}:{name}:version'
+
+
+def get_catalogue_version(name):
+    '''Время последнего изменения справочника, оно же его версия.'''
+    return get_catalogue_cache().get_or_set(
+        catalogue_version_key(name), time.time(), timeout=None)
+
+
+def touch_catalogue(name):
+    get_catalogue_cache().set(
+        catalogue_version_key(name), time.time(), timeout=None)
+
+
+def catalogue_response_key(name, version, query):
+    digest = hashlib.sha256(query.encode()).hexdigest()
+    return f'{CATALOGUE_PREFIX}:{name}:{version}:{digest}'
+
+
+def get_catalogue_response(name, version, query):
+    return get_catalogue_cache().get(
+        catalogue_response_key(name, version, query))
+
+
+def set_catalogue_response(name, version, query, response):
+    get_catalogue_cache().set(
+        catalogue_response_key(name, version, query), response)
@@ -0,0 +1,24 @@
+from recipes.models import Recipe, RecipeDocument
+
+from .serializers import RecipeDocumentSerializer
+
+
+def build(recipes):
+    '''Документы для рецептов из queryset.'''
+    recipes = recipes.select_related('author').prefetch_related(
+        'tags', 'ingredients__ingredient')
+    return [RecipeDocument(recipe=recipe,
+                           data=RecipeDocumentSerializer(recipe).data)
+            for recipe in recipes]
+
+
+def rebuild(recipe_ids):
+    '''Пересборка документов рецептов одним запросом на запись.'''
+    documents = build(Recipe.objects.filter(pk__in=list(recipe_ids)))
+    RecipeDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=['recipe'],
+        update_fields=['data', 'updated'],
+    )
+    return len(documents)
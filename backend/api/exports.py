@@ -0,0 +1,269 @@
+import csv
+import json
+import tempfile
+
+from django.conf import settings
+from django.db.models import F, FloatField
+from django.db.models.aggregates import Sum
+from django.http import (FileResponse, HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from recipes.models import Shopping_list
+from recipes.units import base_factor, base_unit, humanize
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from . import cache
+
+FONT_NAME = 'Vera'
+FONT_FILE = 'Vera.ttf'
+ITERATOR_CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+FILENAME = 'Shopping_cart'
+TITLE = 'Cписок покупок:'
+EMPTY_MESSAGE = 'Cписок покупок пуст!'
+
+
+def register_fonts():
+    '''Регистрация шрифтов для PDF, выполняется один раз при старте.'''
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_FILE))
+
+
+def get_shopping_cart(user):
+    '''Суммарное количество ингредиентов из списка покупок пользователя.
+
+    Совместимые единицы переводятся в базовую и строки одного
+    ингредиента сливаются в том же агрегирующем запросе, количество
+    умножается на множитель порций рецепта.
+    '''
+    unit = 'recipe__ingredients__ingredient__measurement_unit'
+    return Shopping_list.objects.filter(
+        user=user, recipe__ingredients__isnull=False).values(
+        name=F('recipe__ingredients__ingredient__name'),
+        measurement_unit=base_unit(unit),
+    ).annotate(amount=Sum(
+        F('recipe__ingredients__amount') * F('servings') * base_factor(unit),
+        output_field=FloatField(),
+    )).order_by('name', 'measurement_unit')
+
+
+def shopping_cart_lines(items):
+    '''Строки списка с количеством в удобной единице: 1500 г -> 1.5 кг.'''
+    for item in items:
+        amount, unit = humanize(item['amount'], item['measurement_unit'])
+        yield {'name': item['name'], 'amount': amount,
+               'measurement_unit': unit}
+
+
+class Echo:
+    '''Файлоподобный объект, который возвращает записанное значение.'''
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartExporter:
+    '''Базовый класс выгрузки списка покупок.'''
+
+    format = None
+    content_type = None
+    # Документ можно отдавать по мере рендеринга.
+    streaming = True
+
+    def __init__(self, items):
+        self.items = items
+
+    def rows(self):
+        '''Строки списка покупок с порядковым номером.'''
+        for index, item in enumerate(shopping_cart_lines(self.items),
+                                     start=1):
+            yield (index,
+                   item['name'],
+                   item['amount'],
+                   item['measurement_unit'])
+
+    def stream(self):
+        raise NotImplementedError
+
+    def write(self, file):
+        '''Запись документа в бинарный файл по частям.'''
+        for chunk in self.stream():
+            file.write(chunk.encode())
+
+    @classmethod
+    def get_filename(cls):
+        return f'{FILENAME}.{cls.format}'
+
+
+class TextExporter(ShoppingCartExporter):
+    format = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def stream(self):
+        empty = True
+        for index, name, amount, unit in self.rows():
+            if empty:
+                yield f'{TITLE}\n'
+                empty = False
+            yield f'{index}. {name} - {amount} {unit}.\n'
+        if empty:
+            yield f'{EMPTY_MESSAGE}\n'
+
+
+class CsvExporter(ShoppingCartExporter):
+    format = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def stream(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for _, name, amount, unit in self.rows():
+            yield writer.writerow((name, amount, unit))
+
+
+class JsonExporter(ShoppingCartExporter):
+    format = 'json'
+    content_type = 'application/json'
+
+    def stream(self):
+        yield '['
+        for index, name, amount, unit in self.rows():
+            separator = ',' if index > 1 else ''
+            yield separator + json.dumps(
+                {'name': name, 'amount': amount, 'measurement_unit': unit},
+                ensure_ascii=False)
+        yield ']'
+
+
+class PdfExporter(ShoppingCartExporter):
+    '''PDF требует таблицу ссылок в конце файла, поэтому отдаётся только
+    после окончания рендеринга.'''
+
+    format = 'pdf'
+    content_type = 'application/pdf'
+    streaming = False
+
+    def write(self, file):
+        page = canvas.Canvas(file)
+        x_position, y_position = 50, 800
+        page.setFont(FONT_NAME, 24)
+        empty = True
+        for index, name, amount, unit in self.rows():
+            if empty:
+                page.drawString(x_position, y_position, TITLE)
+                page.setFont(FONT_NAME, 12)
+                empty = False
+            y_position -= 15
+            if y_position <= 50:
+                page.showPage()
+                page.setFont(FONT_NAME, 12)
+                y_position = 800
+            page.drawString(x_position, y_position,
+                            f'{index}. {name} - {amount} {unit}.')
+        if empty:
+            page.drawString(x_position, y_position, EMPTY_MESSAGE)
+        page.save()
+
+
+EXPORTERS = {
+    exporter.format: exporter
+    for exporter in (PdfExporter, TextExporter, CsvExporter, JsonExporter)
+}
+DEFAULT_FORMAT = PdfExporter.format
+
+
+def render_document(user, format):
+    '''Рендеринг документа во временный файл для PDF и фоновой выгрузки.
+
+    Большие списки сбрасываются на диск, а не держатся в памяти.
+    '''
+    exporter = EXPORTERS[format](
+        get_shopping_cart(user).iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    exporter.write(file)
+    size = file.tell()
+    file.seek(0)
+    return file, size
+
+
+def stream_document(user_id, version, exporter, etag):
+    '''Части документа по мере рендеринга.
+
+    Отправленные части копятся, пока документ не больше
+    SHOPPING_CART_CACHE_MAX_SIZE, и после отправки последней документ
+    попадает в кэш; при обрыве соединения он не кэшируется.
+    '''
+    chunks, size = [], 0
+    for chunk in exporter.stream():
+        chunk = chunk.encode()
+        size += len(chunk)
+        if chunks is not None:
+            chunks.append(chunk)
+            if size > settings.SHOPPING_CART_CACHE_MAX_SIZE:
+                chunks = None
+        yield chunk
+    if chunks is not None:
+        cache.set_document(user_id, version, exporter.format,
+                           (etag, b''.join(chunks)))
+
+
+def streaming_response(user, version, format, etag):
+    '''Потоковый ответ при промахе кэша.
+
+    ETag берётся из версии списка, а не из содержимого, поэтому он есть
+    уже у первого ответа и совпадает с ETag документа из кэша.
+    '''
+    exporter = EXPORTERS[format](
+        get_shopping_cart(user).iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+    response = StreamingHttpResponse(
+        stream_document(user.id, version, exporter, etag),
+        content_type=exporter.content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{exporter.get_filename()}"')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def document_response(request, exporter, etag, content=None, file=None):
+    '''Ответ с документом либо 304, если у клиента актуальная версия.'''
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        if file is not None:
+            file.close()
+        response = HttpResponseNotModified()
+    elif file is not None:
+        response = FileResponse(file, as_attachment=True,
+                                filename=exporter.get_filename(),
+                                content_type=exporter.content_type)
+        response.block_size = FILE_CHUNK_SIZE
+    else:
+        response = HttpResponse(content, content_type=exporter.content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{exporter.get_filename()}"')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def export_shopping_cart(request, format=DEFAULT_FORMAT):
+    '''Список покупок в выбранном формате с кэшированием документа.'''
+    user = request.user
+    exporter = EXPORTERS[format]
+    version = cache.get_version(user.id)
+    document = cache.get_document(user.id, version, format)
+    if document is not None:
+        etag, content = document
+        return document_response(request, exporter, etag, content=content)
+    etag = cache.document_etag(user.id, version, format)
+    if exporter.streaming:
+        return streaming_response(user, version, format, etag)
+    file, size = render_document(user, format)
+    if size > settings.SHOPPING_CART_CACHE_MAX_SIZE:
+        return document_response(request, exporter, etag, file=file)
+    content = file.read()
+    file.close()
+    cache.set_document(user.id, version, format, (etag, content))
+    return document_response(request, exporter, etag, content=content)
@@ -0,0 +1,74 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from recipes.models import Ingredient
+
+
+def normalize(text):
+    '''Приведение к нижнему регистру с заменой ё на е.'''
+    return text.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    '''Индекс каталога ингредиентов в памяти процесса.
+
+    Каталог небольшой и почти не меняется, поэтому поиск по префиксу
+    идёт бинарным поиском по отсортированному списку имён, а поиск по
+    вхождению — проходом по тому же списку, без запросов к базе.
+    Индекс перестраивается при изменении ингредиентов в этом процессе
+    и по истечении INGREDIENT_INDEX_TTL, чтобы подхватить изменения,
+    сделанные другими процессами.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._index = None
+
+    def is_expired(self):
+        return (time.monotonic() - self._built_at
+                > settings.INGREDIENT_INDEX_TTL)
+
+    def build(self):
+        items = sorted(
+            (normalize(item['name']), item['id'], item)
+            for item in Ingredient.objects.values(
+                'id', 'name', 'measurement_unit')
+        )
+        self._built_at = time.monotonic()
+        self._index = ([key for key, _, _ in items],
+                       [item for _, _, item in items])
+        return self._index
+
+    def get_index(self):
+        index = self._index
+        if index is None or self.is_expired():
+            with self._lock:
+                index = self._index
+                if index is None or self.is_expired():
+                    index = self.build()
+        return index
+
+    def search(self, query, limit=None):
+        '''Сначала совпадения по началу названия, затем по вхождению.'''
+        keys, entries = self.get_index()
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', lo=start)
+        result = entries[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for position, key in enumerate(keys):
+            if query in key and not start <= position < end:
+                result.append(entries[position])
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,531 @@
+import base64
+import csv
+import io
+import json
+import math
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from functools import partial
+from itertools import cycle
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from api import cache
+from api.exports import EXPORTERS
+from api.ingredient_index import ingredient_index
+from api.pagination import KeysetPagination
+from api.utils import IngredientFilter
+from PIL import Image
+from recipes import bulk
+from recipes.ingredient_sets import ingredient_sets, parse_match
+from recipes.images import RENDITION_FORMATS, rendition_name
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            Shopping_list, Tag)
+from rest_framework.authtoken.models import Token
+from users.models import Follow, User
+
+FEED_FOLLOWS = (10, 10000)
+CART_BATCH = 500
+EXPORT_CART_SIZES = (10, 100, 1000)
+RECIPE_INGREDIENTS = (5, 50, 200)
+LOAD_ROWS = (100000, 1000000)
+PAGE_DEPTHS = (1000, 10000)
+CATALOGUES = ('tags', 'ingredients')
+SEARCH_MISS = 'несуществующеесловодлязамера'
+HAVE_MODES = {
+    'all': 'all',
+    'any': 'any',
+    'coverage': 'coverage>=0.5',
+}
+PANTRY_SIZE = 20
+PHOTO_SIZE = (2400, 1600)
+PHOTO_RECIPES = 6
+RENDITIONS_TIMEOUT = 300
+REMOTE_ADDR = '192.0.2.1'
+
+
+def percentile(values, percent):
+    '''Перцентиль по методу ближайшего ранга.'''
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', 'HEAD'), capture_output=True, text=True,
+            cwd=settings.BASE_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reset_peak_rss():
+    '''Сброс пика RSS процесса; на Linux пишется 5 в clear_refs.'''
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_kb():
+    '''Пик RSS с последнего сброса (VmHWM), без /proc — за всё время.'''
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def photo(size=PHOTO_SIZE):
+    '''JPEG около 1,5 МБ в base64, каждый раз новый. Шум в нескольких
+    масштабах сжимается похоже на фотографию, в том числе в копиях.'''
+    bands = []
+    for _ in range(3):
+        coarse, middle, fine = (
+            Image.effect_noise((size[0] // scale, size[1] // scale), 64)
+            .resize(size, Image.BICUBIC) for scale in (64, 8, 1))
+        bands.append(Image.blend(Image.blend(coarse, middle, 0.4), fine, 0.2))
+    content = io.BytesIO()
+    Image.merge('RGB', bands).save(content, 'JPEG', quality=90)
+    return ('data:image/jpeg;base64,'
+            + base64.b64encode(content.getvalue()).decode())
+
+
+def write_catalogue(file, format, rows):
+    '''Синтетический каталог ингредиентов с уникальными названиями.'''
+    items = ({'name': f'ингредиент для замера {number}',
+              'measurement_unit': ('г', 'мл', 'шт.')[number % 3]}
+             for number in range(rows))
+    if format == 'csv':
+        csv.writer(file).writerows(
+            (item['name'], item['measurement_unit']) for item in items)
+        return
+    file.write('[\n')
+    for number, item in enumerate(items):
+        file.write(('' if number == 0 else ',\n')
+                   + json.dumps(item, ensure_ascii=False))
+    file.write('\n]\n')
+
+
+class Command(BaseCommand):
+    help = ('Замер задержек, числа SQL-запросов и памяти на настоящих '
+            'маршрутах API; результат в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Запустить только указанные сценарии.')
+        parser.add_argument('--output', help='Файл для JSON-результата.')
+        parser.add_argument(
+            '--host', default=settings.ALLOWED_HOSTS[0],
+            help='Значение заголовка Host для запросов.')
+
+    def handle(self, *args, **options):
+        self.user = (User.objects.annotate(carts=Count('shopping_list'))
+                     .filter(carts__gt=0, follower__isnull=False)
+                     .order_by('-carts').first())
+        recipe = Recipe.objects.order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        ingredient = Ingredient.objects.order_by('pk').first()
+        if None in (self.user, recipe, tag, ingredient):
+            raise CommandError('Нет данных, сначала запустите generate_data.')
+        self.host = options['host']
+        self.client = self.make_client(self.user)
+        self.own_recipe = self.user.recipe.order_by('pk').first()
+        self.created = []
+        self.temp_users = []
+        self.cleanup = ExitStack()
+        self.recipe_payload = {
+            'name': 'Рецепт для замера',
+            'text': 'Текст рецепта для замера',
+            'cooking_time': 10,
+            'tags': [tag.pk],
+            'ingredients': [{'id': pk, 'amount': 10} for pk in
+                            Ingredient.objects.values_list('pk', flat=True)
+                            .order_by('pk')[:10]],
+        }
+        word = recipe.name.split()[0]
+        phrase = ' '.join(recipe.name.split()[:2])
+        list_url = reverse('api:recipes-list')
+        scenarios = {
+            'recipes_list': ('get', list_url),
+            'recipes_list_page_5': ('get', f'{list_url}?page=5'),
+            'recipes_filter_tag': ('get', f'{list_url}?tags={tag.slug}'),
+            'recipes_filter_favorited': ('get', f'{list_url}?is_favorited=1'),
+            'recipes_search': ('get', f'{list_url}?search={word}'),
+            'recipes_search_phrase': (
+                'get', f'{list_url}?search={quote(phrase)}'),
+            'recipes_search_miss': (
+                'get', f'{list_url}?search={SEARCH_MISS}'),
+            'recipes_cursor': ('get', f'{list_url}?cursor='),
+            **{f'recipes_list_page_{page}': (
+                'get', f'{list_url}?page={page}')
+               for page in PAGE_DEPTHS},
+            **{f'recipes_cursor_page_{page}': (
+                'get', None, partial(self.cursor_client, page))
+               for page in PAGE_DEPTHS},
+            'recipe_detail': ('get', reverse('api:recipes-detail',
+                                             args=(recipe.pk,))),
+            'recipe_create': ('post', list_url),
+            'recipe_update': ('patch', None),
+            **{f'recipe_create_{count}': (
+                'post', list_url, partial(self.recipe_client, count))
+               for count in RECIPE_INGREDIENTS},
+            **{f'recipe_update_{count}': (
+                'patch', None, partial(self.recipe_client, count, True))
+               for count in RECIPE_INGREDIENTS},
+            'subscriptions': ('get', reverse('api:subscriptions')),
+            'feed': ('get', reverse('api:recipes-feed')),
+            **{f'feed_follows_{count}': (
+                'get', reverse('api:recipes-feed'),
+                partial(self.feed_client, count))
+               for count in FEED_FOLLOWS},
+            'shopping_cart_pdf': (
+                'get', reverse('api:recipes-download-shopping-cart')),
+            'shopping_cart_txt': (
+                'get', reverse('api:recipes-download-shopping-cart')
+                + '?format=txt'),
+            'ingredient_search': (
+                'get', reverse('api:ingredients-list')
+                + f'?name={ingredient.name[:2]}'),
+            'ingredient_lookup_index': (
+                'call', None, partial(self.lookup_client, partial(
+                    ingredient_index.search, ingredient.name[:2]))),
+            'ingredient_lookup_orm': (
+                'call', None, partial(self.lookup_client, lambda: list(
+                    IngredientFilter(
+                        {'name': ingredient.name[:2]},
+                        Ingredient.objects.all()).qs.values(
+                            'id', 'name', 'measurement_unit')))),
+            **{f'{name}_list': ('get', reverse(f'api:{name}-list'))
+               for name in CATALOGUES},
+            **{f'{name}_list_uncached': (
+                'get', reverse(f'api:{name}-list'),
+                partial(self.catalogue_client, name))
+               for name in CATALOGUES},
+            **{f'{name}_list_not_modified': (
+                'get', reverse(f'api:{name}-list'),
+                partial(self.not_modified_client, name))
+               for name in CATALOGUES},
+            **{f'recipes_have_{mode}': (
+                'get', None, partial(self.have_client, match))
+               for mode, match in HAVE_MODES.items()},
+            'ingredient_sets_build': (
+                'call', None, lambda: (ingredient_sets.build, None, {})),
+            'cart_add_single': ('cart_single', None, self.cart_client),
+            'cart_add_batch': (
+                'cart_batch', reverse('api:bulk_shopping_cart'),
+                self.cart_client),
+            **{f'shopping_cart_{format}_{size}': (
+                'get', reverse('api:recipes-download-shopping-cart')
+                + f'?format={format}', partial(self.export_client, size))
+               for format in EXPORTERS for size in EXPORT_CART_SIZES},
+            'recipe_create_image': ('post', list_url, self.photo_client),
+            'recipes_list_images': ('get', list_url, self.photo_list_client),
+            **{f'load_data_{format}_{rows}': (
+                'call', None, partial(self.load_client, format, rows))
+               for format in ('json', 'csv') for rows in LOAD_ROWS},
+        }
+        selected = options['scenarios'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+        results = {}
+        try:
+            # Фото из сценариев не должны оставаться в MEDIA_ROOT.
+            self.cleanup.enter_context(override_settings(
+                MEDIA_ROOT=self.cleanup.enter_context(
+                    tempfile.TemporaryDirectory())))
+            for name in selected:
+                method, url, *setup = scenarios[name]
+                if name == 'recipe_update':
+                    if self.own_recipe is None:
+                        continue
+                    url = reverse('api:recipes-detail',
+                                  args=(self.own_recipe.pk,))
+                client, prepare, info = self.client, None, {}
+                self.payload = self.recipe_payload
+                if setup:
+                    client, prepare, info = setup[0]()
+                    url = info.get('url', url)
+                results[name] = self.run_scenario(
+                    client, method, url,
+                    options['iterations'], options['warmup'], prepare)
+                results[name].update(info)
+        finally:
+            Recipe.objects.filter(pk__in=self.created).delete()
+            User.objects.filter(pk__in=self.temp_users).delete()
+            self.cleanup.close()
+        report = json.dumps({
+            'commit': git_commit(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'recipes': Recipe.objects.count(),
+            'scenarios': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        self.stdout.write(report)
+
+    def make_client(self, user):
+        '''Клиент с токеном пользователя. Адрес не из INTERNAL_IPS, иначе
+        при DEBUG в замер попадает debug toolbar.'''
+        token, _ = Token.objects.get_or_create(user=user)
+        return Client(HTTP_AUTHORIZATION=f'Token {token.key}',
+                      HTTP_HOST=self.host, REMOTE_ADDR=REMOTE_ADDR)
+
+    def temp_user(self, username):
+        User.objects.filter(username=username).delete()
+        user = User.objects.create(
+            username=username, email=f'{username}@example.com')
+        self.temp_users.append(user.pk)
+        return user
+
+    # Подготовка сценария возвращает клиента, функцию, вызываемую перед
+    # каждым запросом вне замера, и поля для результата сценария.
+
+    def feed_client(self, count):
+        '''Клиент временного пользователя, подписанного на count авторов
+        с наибольшим числом рецептов.
+
+        Подписки создаются пакетом с сигналом, как через API: удаление
+        пользователя в конце уменьшает followers_count авторов, и без
+        увеличения здесь счётчики остались бы ниже настоящих.
+        '''
+        user = self.temp_user(f'benchmark_feed_{count}')
+        authors = User.objects.exclude(pk=user.pk).order_by(
+            '-recipes_count').values_list('pk', flat=True)[:count]
+        bulk.add(Follow, user, list(authors))
+        return self.make_client(user), None, {
+            'follows': Follow.objects.filter(user=user).count()}
+
+    def cart_client(self):
+        '''Клиент временного пользователя с пустым списком покупок перед
+        каждым повтором: CART_BATCH рецептов по одному или одним пакетом.'''
+        user = self.temp_user('benchmark_cart')
+        self.cart_ids = list(Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True)[:CART_BATCH])
+        return self.make_client(user), (
+            lambda: Shopping_list.objects.filter(user=user).delete()), {
+            'recipes': len(self.cart_ids)}
+
+    def export_client(self, size):
+        '''Клиент временного пользователя с size рецептами в списке
+        покупок; кэш документов сбрасывается перед каждым запросом.'''
+        user = self.temp_user(f'benchmark_export_{size}')
+        recipes = Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True)[:size]
+        # С сигналом, как в feed_client: иначе удаление пользователя
+        # уменьшит in_carts_count рецептов.
+        bulk.add(Shopping_list, user, list(recipes))
+        return self.make_client(user), (
+            lambda: cache.invalidate([user.pk])), {'recipes': len(recipes)}
+
+    def recipe_client(self, count, update=False):
+        '''Запись рецепта с count ингредиентами. Количества чередуются,
+        чтобы каждый PATCH менял все строки; рецепт для PATCH создаётся
+        заранее.'''
+        ids = Ingredient.objects.order_by('pk').values_list(
+            'pk', flat=True)[:count]
+        amounts = cycle((10, 20))
+
+        def prepare():
+            amount = next(amounts)
+            self.payload = dict(self.recipe_payload, ingredients=[
+                {'id': pk, 'amount': amount} for pk in ids])
+        info = {'ingredients': len(ids)}
+        if update:
+            prepare()
+            response = self.request(self.client, 'post',
+                                    reverse('api:recipes-list'))
+            info['url'] = reverse('api:recipes-detail',
+                                  args=(response.json()['id'],))
+        return self.client, prepare, info
+
+    def have_client(self, match):
+        '''Поиск по имеющимся ингредиентам: PANTRY_SIZE самых частых
+        и все ингредиенты первого рецепта, чтобы в режиме all было что
+        найти.'''
+        common = IngredientInRecipe.objects.values('ingredient').annotate(
+            recipes=Count('recipe')).order_by('-recipes').values_list(
+            'ingredient', flat=True)[:PANTRY_SIZE]
+        have = set(common) | set(IngredientInRecipe.objects.filter(
+            recipe=Recipe.objects.order_by('pk').first()).values_list(
+            'ingredient', flat=True))
+        query = ','.join(map(str, sorted(have)))
+        return self.client, None, {
+            'url': f'{reverse("api:recipes-list")}?have={query}'
+                   f'&match={quote(match)}',
+            'have': len(have),
+            'matches': len(ingredient_sets.match(
+                have, parse_match(match))),
+        }
+
+    def catalogue_client(self, name):
+        '''Справочник со сброшенным перед каждым запросом кэшем.'''
+        return self.client, partial(cache.touch_catalogue, name), {}
+
+    def not_modified_client(self, name):
+        '''Повторный запрос справочника с ETag из предыдущего ответа.'''
+        etag = self.client.get(reverse(f'api:{name}-list'))['ETag']
+        client = Client(**self.client.defaults, HTTP_IF_NONE_MATCH=etag)
+        return client, None, {}
+
+    def cursor_client(self, page):
+        '''Курсор на ту же глубину, что и ?page=page.'''
+        pagination = KeysetPagination()
+        offset = (page - 1) * pagination.page_size
+        recipe = Recipe.objects.order_by(*pagination.ordering)[offset - 1]
+        cursor = pagination.encode_cursor(pagination.get_position(recipe))
+        return self.client, None, {
+            'url': f'{reverse("api:recipes-list")}?cursor={cursor}',
+            'offset': offset}
+
+    def photo_client(self):
+        '''Создание рецепта с новым фото на каждом повторе; копии
+        создаются в фоне и в задержку запроса не входят.'''
+        def prepare():
+            self.payload = dict(self.recipe_payload, image=photo())
+        prepare()
+        return self.client, prepare, {
+            'image_base64_bytes': len(self.payload['image'])}
+
+    def photo_list_client(self):
+        '''Страница из PHOTO_RECIPES рецептов с фото после готовности
+        копий: сколько весят оригиналы и копии, на которые она ссылается.'''
+        user = self.temp_user('benchmark_photo')
+        client = self.make_client(user)
+        for _ in range(PHOTO_RECIPES):
+            self.payload = dict(self.recipe_payload, image=photo())
+            self.request(client, 'post', reverse('api:recipes-list'))
+        started = time.perf_counter()
+        recipes = Recipe.objects.filter(author=user)
+        while recipes.exclude(renditions_image=F('image')).exists():
+            if time.perf_counter() - started > RENDITIONS_TIMEOUT:
+                raise CommandError('Копии фото не созданы вовремя.')
+            time.sleep(0.1)
+        info = {'url': f'{reverse("api:recipes-list")}?author={user.pk}',
+                'renditions_wait_s': round(time.perf_counter() - started, 1),
+                'original_bytes': 0}
+        for recipe in recipes:
+            storage = recipe.image.storage
+            info['original_bytes'] += recipe.image.size
+            for label, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+                for format in RENDITION_FORMATS:
+                    key = f'{label}_{format}_bytes'
+                    info[key] = info.get(key, 0) + storage.size(
+                        rendition_name(recipe.image.name, size, format))
+        self.payload = self.recipe_payload
+        return client, None, info
+
+    def lookup_client(self, lookup):
+        '''Вызов поиска ингредиентов в обход HTTP: индекс против ORM.'''
+        return lookup, None, {'results': len(lookup())}
+
+    def load_client(self, format, rows):
+        '''load_data на сгенерированном файле; каждый прогон
+        откатывается, чтобы каталог в базе не рос.'''
+        with tempfile.NamedTemporaryFile(
+                'w', suffix=f'.{format}', encoding='utf-8', newline='',
+                delete=False) as file:
+            self.cleanup.callback(Path(file.name).unlink, missing_ok=True)
+            write_catalogue(file, format, rows)
+
+        def load():
+            with transaction.atomic():
+                call_command('load_data', file.name, stdout=io.StringIO())
+                transaction.set_rollback(True)
+        return load, None, {'rows': rows,
+                            'file_bytes': Path(file.name).stat().st_size}
+
+    def request(self, client, method, url):
+        if method == 'call':
+            client()
+            return SimpleNamespace(status_code=None)
+        if method == 'cart_single':
+            for pk in self.cart_ids:
+                response = client.post(
+                    reverse('api:shopping_cart', args=(pk,)))
+            return response
+        if method == 'cart_batch':
+            return client.post(url, {'ids': self.cart_ids},
+                               content_type='application/json')
+        if method == 'get':
+            response = client.get(url)
+        else:
+            response = getattr(client, method)(
+                url, self.payload, content_type='application/json')
+        if method == 'post' and response.status_code == 201:
+            self.created.append(response.json()['id'])
+        if hasattr(response, 'streaming_content'):
+            response.size = sum(map(len, response.streaming_content))
+        else:
+            response.size = len(response.content)
+        return response
+
+    def run_scenario(self, client, method, url, iterations, warmup,
+                     prepare=None):
+        '''Задержки и запросы по итерациям, пик памяти отдельным проходом,
+        потому что tracemalloc сам замедляет запрос. prepare вызывается
+        перед каждым запросом вне замера.'''
+        prepare = prepare or (lambda: None)
+        for _ in range(warmup):
+            prepare()
+            self.request(client, method, url)
+        latencies = []
+        queries = []
+        statuses = set()
+        for _ in range(iterations):
+            prepare()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self.request(client, method, url)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+        prepare()
+        reset_peak_rss()
+        tracemalloc.start()
+        response = self.request(client, method, url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss = peak_rss_kb()
+        return {
+            'url': url,
+            'method': method.upper(),
+            'status': sorted(statuses),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 2),
+                'p90': round(percentile(latencies, 90), 2),
+                'p99': round(percentile(latencies, 99), 2),
+                'mean': round(sum(latencies) / len(latencies), 2),
+                'max': round(max(latencies), 2),
+            },
+            'per_second': round(1000 * len(latencies) / sum(latencies), 1),
+            'queries': {'min': min(queries), 'max': max(queries)},
+            'peak_memory_kb': round(peak / 1024, 1),
+            'peak_rss_kb': rss,
+            'response_bytes': getattr(response, 'size', None),
+        }
@@ -0,0 +1,67 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.resources import RecipeResource, recipe_record
+
+FORMATS = ('jsonl', 'csv')
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка рецептов с тегами и ингредиентами в JSON Lines или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', help='Файл для выгрузки, по умолчанию stdout.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат, по умолчанию определяется по расширению файла.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число рецептов, загружаемых из базы за раз.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or (
+            'csv' if path and path.endswith('.csv') else 'jsonl')
+        started = time.monotonic()
+        file = (open(path, 'w', encoding='utf-8', newline='') if path
+                else sys.stdout)
+        try:
+            total = self.export(file, format, options['batch_size'])
+        finally:
+            if path:
+                file.close()
+        if path:
+            self.stdout.write(f'Выгружено {total} рецептов за '
+                              f'{time.monotonic() - started:.2f} с.')
+
+    def chunks(self, resource, batch_size):
+        '''Рецепты пачками по id, память не растёт с размером базы.'''
+        last = 0
+        while True:
+            chunk = list(resource.get_queryset().filter(
+                pk__gt=last).order_by('pk')[:batch_size])
+            if not chunk:
+                return
+            yield chunk
+            last = chunk[-1].pk
+
+    def export(self, file, format, batch_size):
+        resource = RecipeResource()
+        if format == 'csv':
+            writer = csv.writer(file)
+            writer.writerow(resource.get_export_headers())
+        total = 0
+        for chunk in self.chunks(resource, batch_size):
+            for recipe in chunk:
+                if format == 'csv':
+                    writer.writerow(resource.export_resource(recipe))
+                else:
+                    file.write(json.dumps(recipe_record(recipe),
+                                          ensure_ascii=False) + '\n')
+            total += len(chunk)
+        return total
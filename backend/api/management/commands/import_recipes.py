@@ -0,0 +1,263 @@
+import csv
+import json
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, reset_queries, transaction
+
+from api import cache, documents
+from recipes import feed
+from recipes.counters import COUNTERS_BY_SOURCE, recount_rows
+from recipes.ingredient_sets import ingredient_sets
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from recipes.resources import parse_csv_row
+from recipes.search import reindex
+from users.models import User
+
+FORMATS = ('jsonl', 'csv')
+
+
+def read_jsonl(file):
+    '''Непустые строки файла с номерами; разбор идёт в Importer.build.'''
+    for number, line in enumerate(file, start=1):
+        if line.strip():
+            yield number, line
+
+
+def parse_jsonl(line):
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise TypeError('Запись не объект JSON')
+    return record
+
+
+def read_csv(file):
+    reader = csv.DictReader(file)
+    for row in reader:
+        yield reader.line_num, row
+
+
+# Формат: чтение строк с номерами и разбор одной строки в запись.
+READERS = {
+    'jsonl': (read_jsonl, parse_jsonl),
+    'csv': (read_csv, parse_csv_row),
+}
+# Сколько номеров пропущенных строк выводить в отчёте.
+SKIPPED_SHOWN = 20
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def clean(model, name, value):
+    '''Значение, приведённое и проверенное валидаторами поля модели.'''
+    return model._meta.get_field(name).clean(value, None)
+
+
+def build_maps(default_author):
+    '''Словари id ингредиентов, тегов и авторов, строятся один раз.'''
+    ingredients = {
+        (name, unit): pk for pk, name, unit in
+        Ingredient.objects.values_list('pk', 'name', 'measurement_unit')}
+    tags = dict(Tag.objects.values_list('slug', 'pk'))
+    authors = dict(User.objects.values_list('email', 'pk'))
+    default = None
+    if default_author is not None:
+        default = authors.get(default_author)
+        if default is None:
+            raise CommandError(f'Нет пользователя {default_author}.')
+    return ingredients, tags, authors, default
+
+
+class Importer:
+    '''Запись пачек рецептов: по транзакции и по одному bulk_create на
+    таблицу в каждой пачке.'''
+
+    def __init__(self, maps, parse, documents=True):
+        self.ingredients, self.tags, self.authors, self.default = maps
+        self.parse = parse
+        self.documents = documents
+        self.imported = 0
+        self.skipped = []
+        self.new_ingredients = 0
+        self.authors_touched = set()
+
+    def resolve_ingredients(self, records):
+        '''Недостающие ингредиенты создаются и добавляются в словарь.'''
+        missing = {(name, unit) for record in records
+                   for name, unit, _ in record['ingredients']
+                   if (name, unit) not in self.ingredients}
+        if not missing:
+            return
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing), ignore_conflicts=True)
+        for pk, name, unit in Ingredient.objects.filter(
+                name__in={name for name, _ in missing}).values_list(
+                'pk', 'name', 'measurement_unit'):
+            self.ingredients[name, unit] = pk
+        self.new_ingredients += len(missing)
+
+    def build(self, row):
+        '''Запись и рецепт из строки файла.
+
+        Разбор строки и проверка времени приготовления и количеств
+        валидаторами полей идут здесь, чтобы одна испорченная строка или
+        запись вне диапазона не отменяла всю пачку.
+        '''
+        record = self.parse(row)
+        author = self.authors.get(record.get('author'), self.default)
+        if author is None:
+            raise ValueError('Неизвестный автор')
+        record['ingredients'] = [
+            (str(name), str(unit), clean(IngredientInRecipe, 'amount', amount))
+            for name, unit, amount in record['ingredients']]
+        return record, Recipe(
+            author_id=author, name=record['name'], text=record['text'],
+            cooking_time=clean(Recipe, 'cooking_time',
+                               record['cooking_time']),
+            image=record.get('image') or None)
+
+    def write(self, chunk):
+        recipes, records = [], []
+        for number, row in chunk:
+            try:
+                record, recipe = self.build(row)
+            except (AttributeError, KeyError, TypeError, ValueError,
+                    ValidationError):
+                self.skipped.append(number)
+                continue
+            recipes.append(recipe)
+            records.append(record)
+        if not recipes:
+            return []
+        with transaction.atomic():
+            self.resolve_ingredients(records)
+            Recipe.objects.bulk_create(recipes)
+            through = Recipe.tags.through
+            through.objects.bulk_create(
+                through(recipe_id=recipe.pk, tag_id=self.tags[slug])
+                for recipe, record in zip(recipes, records)
+                for slug in record.get('tags', ()) if slug in self.tags)
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe_id=recipe.pk,
+                    ingredient_id=self.ingredients[name, unit],
+                    amount=amount)
+                for recipe, record in zip(recipes, records)
+                for name, unit, amount in record['ingredients'])
+        ids = [recipe.pk for recipe in recipes]
+        self.refresh(ids)
+        # При DEBUG Django хранит тексты последних запросов, а запросы
+        # пачки занимают мегабайты.
+        reset_queries()
+        self.imported += len(ids)
+        self.authors_touched.update(recipe.author_id for recipe in recipes)
+        return ids
+
+    def refresh(self, recipe_ids):
+        '''Пакетная вставка не вызывает сигналы: поиск, наборы ингредиентов,
+        документы и ленты обновляются после коммита пачки.'''
+        reindex(recipe_ids)
+        ingredient_sets.update(recipe_ids)
+        if self.documents:
+            documents.rebuild(recipe_ids)
+        feed.fan_out(recipe_ids)
+
+
+def import_partition(path, format, batch_size, documents, workers, index,
+                     maps):
+    '''Пачки с номерами index, index + workers, ... одного файла.
+
+    Файл читает каждый процесс, но пишет только свои пачки, поэтому
+    разбиение одинаково работает для JSON Lines и CSV с переводами
+    строк внутри полей.
+    '''
+    read, parse = READERS[format]
+    importer = Importer(maps, parse, documents)
+    try:
+        with open(path, encoding='utf-8', newline='') as file:
+            for number, chunk in enumerate(batches(read(file), batch_size)):
+                if number % workers == index:
+                    importer.write(chunk)
+    finally:
+        if workers > 1:
+            connections.close_all()
+    return (importer.imported, importer.skipped, importer.new_ingredients,
+            importer.authors_touched)
+
+
+class Command(BaseCommand):
+    help = ('Загрузка рецептов с тегами и ингредиентами из JSON Lines или '
+            'CSV пачками, при необходимости в несколько процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .jsonl или .csv.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат, по умолчанию определяется по расширению файла.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число рецептов в одной транзакции.')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов; 1 — без отдельных процессов.')
+        parser.add_argument(
+            '--default-author',
+            help='Email автора для рецептов с неизвестным автором; без '
+                 'него такие рецепты пропускаются.')
+        parser.add_argument(
+            '--no-documents', dest='documents', action='store_false',
+            help='Не собирать готовые документы при загрузке; их можно '
+                 'собрать потом командой rebuild_recipe_documents.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        format = options['format'] or (
+            'csv' if path.suffix.lower() == '.csv' else 'jsonl')
+        maps = build_maps(options['default_author'])
+        workers = max(options['workers'], 1)
+        arguments = (str(path), format, options['batch_size'],
+                     options['documents'], workers)
+        started = time.monotonic()
+        if workers > 1:
+            # Дочерние процессы не должны наследовать открытое соединение.
+            connections.close_all()
+            with ProcessPoolExecutor(workers) as executor:
+                futures = [
+                    executor.submit(import_partition, *arguments, index, maps)
+                    for index in range(workers)]
+                results = [future.result() for future in futures]
+        else:
+            results = [import_partition(*arguments, 0, maps)]
+        imported = sum(result[0] for result in results)
+        skipped = sorted(number for result in results for number in result[1])
+        new_ingredients = sum(result[2] for result in results)
+        authors = set().union(*(result[3] for result in results))
+        recount_rows(COUNTERS_BY_SOURCE[Recipe], authors)
+        if new_ingredients:
+            cache.touch_catalogue('ingredients')
+        elapsed = time.monotonic() - started
+        peak = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        self.stdout.write(
+            f'Загружено {imported}, пропущено {len(skipped)}, новых '
+            f'ингредиентов {new_ingredients} за {elapsed:.2f} с '
+            f'({imported / elapsed if elapsed else 0:.0f} рецептов/с), '
+            f'пик памяти процесса {peak / 1024:.1f} МБ.')
+        if skipped:
+            shown = ', '.join(map(str, skipped[:SKIPPED_SHOWN]))
+            more = ', ...' if len(skipped) > SKIPPED_SHOWN else ''
+            self.stdout.write(f'Пропущены строки: {shown}{more}.')
@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import documents
+from recipes.models import Recipe
+
+
+def batches(ids, size):
+    ids = iter(ids)
+    while True:
+        batch = list(islice(ids, size))
+        if not batch:
+            return
+        yield batch
+
+
+def rebuild_batch(recipe_ids):
+    '''Пересборка пачки в дочернем процессе со своим соединением.'''
+    try:
+        return documents.rebuild(recipe_ids)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Пересборка готовых документов рецептов пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Число рецептов в одной пачке.')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов; 1 — без отдельных процессов.')
+
+    def handle(self, *args, **options):
+        ids = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        chunks = batches(ids.iterator(), options['batch_size'])
+        started = time.monotonic()
+        if options['workers'] > 1:
+            # Дочерние процессы не должны наследовать открытое соединение.
+            chunks = list(chunks)
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as executor:
+                total = sum(executor.map(rebuild_batch, chunks))
+        else:
+            total = sum(map(documents.rebuild, chunks))
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Пересобрано {total} документов за {elapsed:.2f} с.')
@@ -0,0 +1,134 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    '''Гистограмма с фиксированными границами, как в Prometheus.'''
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    '''Метрики процесса: гистограммы и счётчики с метками.
+
+    Каждый процесс gunicorn собирает свои метрики, и /metrics отдаёт
+    метрики того процесса, который обработал запрос Prometheus.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._buckets = {}
+        self._histograms = defaultdict(dict)
+        self._counters = defaultdict(lambda: defaultdict(float))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        self._help[name] = help
+        self._buckets[name] = buckets
+
+    def counter(self, name, help):
+        self._help[name] = help
+        self._counters[name]
+
+    def observe(self, name, labels, value):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = Histogram(
+                    self._buckets[name])
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[name][tuple(sorted(labels.items()))] += amount
+
+    def render(self):
+        '''Метрики в текстовом формате Prometheus.'''
+        lines = []
+        with self._lock:
+            for name, series in self._histograms.items():
+                lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} histogram')
+                for key, histogram in series.items():
+                    cumulative = 0
+                    bounds = (*histogram.buckets, '+Inf')
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        labels = format_labels(key + (('le', bound),))
+                        lines.append(f'{name}_bucket{labels} {cumulative}')
+                    labels = format_labels(key)
+                    lines.append(f'{name}_sum{labels} {histogram.sum}')
+                    lines.append(f'{name}_count{labels} {histogram.count}')
+            for name, series in self._counters.items():
+                lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} counter')
+                for key, value in series.items():
+                    lines.append(f'{name}{format_labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(items):
+    if not items:
+        return ''
+    labels = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in items)
+    return '{' + labels + '}'
+
+
+registry = Registry()
+registry.histogram('foodgram_request_duration_seconds',
+                   'Полное время обработки запроса.')
+registry.histogram('foodgram_request_db_seconds',
+                   'Время запросов к базе за HTTP-запрос.')
+registry.histogram('foodgram_request_render_seconds',
+                   'Время рендеринга ответа DRF.')
+registry.histogram('foodgram_request_queries',
+                   'Число запросов к базе за HTTP-запрос.', QUERY_BUCKETS)
+registry.counter('foodgram_requests_total',
+                 'Обработанные запросы из выборки.')
+registry.counter('foodgram_n_plus_one_total',
+                 'Запросы, в которых один SQL повторился больше порога.')
+
+
+def shopping_cart_cache_lines():
+    stats = cache.get_stats()
+    return [
+        '# HELP foodgram_shopping_cart_cache_total '
+        'Обращения к кэшу документов списка покупок.',
+        '# TYPE foodgram_shopping_cart_cache_total counter',
+        'foodgram_shopping_cart_cache_total{result="hit"} '
+        f'{stats["hits"]}',
+        'foodgram_shopping_cart_cache_total{result="miss"} '
+        f'{stats["misses"]}',
+    ]
+
+
+def metrics_view(request):
+    '''Метрики для Prometheus; при METRICS_TOKEN нужен Bearer-токен.'''
+    if settings.METRICS_TOKEN and request.headers.get(
+            'Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponseForbidden()
+    content = registry.render() + '\n'.join(shopping_cart_cache_lines())
+    return HttpResponse(content + '\n', content_type=CONTENT_TYPE)
@@ -0,0 +1,144 @@
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r'(%s, )+%s')
+
+
+class QueryRecorder:
+    '''Обёртка выполнения SQL: число запросов, время и повторы.'''
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def most_repeated(self):
+        '''Самая частая форма SQL; списки IN разной длины считаются одной.'''
+        shapes = Counter()
+        for sql, count in self.statements.items():
+            shapes[IN_LIST_RE.sub('%s...', sql)] += count
+        return shapes.most_common(1)[0] if shapes else (None, 0)
+
+
+class InstrumentationMiddleware:
+    '''Замеры запросов из выборки: SQL, время базы, рендеринг, итог.
+
+    Для запросов из выборки добавляется заголовок Server-Timing, данные
+    попадают в гистограммы /metrics, а повтор одного SQL больше
+    METRICS_N_PLUS_ONE_THRESHOLD раз логируется как вероятный N+1. При
+    METRICS_SAMPLE_RATE = 0 middleware отключается при старте и ничего
+    не стоит.
+    '''
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.METRICS_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.METRICS_SAMPLE_RATE
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        request.render_duration = 0
+        started = time.perf_counter()
+        with self.recording(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        self.record(request, response, recorder, duration)
+        return response
+
+    async def __acall__(self, request):
+        '''То же для цепочки ASGI без перевода её в поток.
+
+        Соединения с БД у Django свои в каждом потоке, а ORM из async-кода
+        работает в потоке sync_to_async, общем для всего запроса. Обёртка
+        ставится и снимается в этом потоке.
+        '''
+        if not self.sampled():
+            return await self.get_response(request)
+        recorder = QueryRecorder()
+        request.render_duration = 0
+        started = time.perf_counter()
+        stack = await sync_to_async(self.recording)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        duration = time.perf_counter() - started
+        self.record(request, response, recorder, duration)
+        return response
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def recording(self, recorder):
+        '''Обёртка recorder на всех соединениях текущего потока.'''
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def process_template_response(self, request, response):
+        if hasattr(request, 'render_duration'):
+            started = time.perf_counter()
+
+            def rendered(response):
+                request.render_duration = time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, response, recorder, duration):
+        match = request.resolver_match
+        endpoint = (match.view_name or match.route) if match else 'unmatched'
+        labels = {'endpoint': endpoint, 'method': request.method}
+        registry.observe('foodgram_request_duration_seconds', labels,
+                         duration)
+        registry.observe('foodgram_request_db_seconds', labels,
+                         recorder.duration)
+        registry.observe('foodgram_request_render_seconds', labels,
+                         request.render_duration)
+        registry.observe('foodgram_request_queries', labels, recorder.count)
+        registry.inc('foodgram_requests_total',
+                     {**labels, 'status': response.status_code})
+        sql, repeats = recorder.most_repeated()
+        if repeats > settings.METRICS_N_PLUS_ONE_THRESHOLD:
+            registry.inc('foodgram_n_plus_one_total', {'endpoint': endpoint})
+            logger.warning('Вероятный N+1 в %s %s: %d раз %s',
+                           request.method, endpoint, repeats, sql)
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} queries", '
+            f'render;dur={request.render_duration * 1000:.1f}, '
+            f'total;dur={duration * 1000:.1f}')
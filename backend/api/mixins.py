@@ -0,0 +1,58 @@
+import hashlib
+import math
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from . import cache
+
+
+class CachedListMixin:
+    '''Кэширование готового JSON списка справочника.
+
+    Ответ хранится байтами для каждой строки запроса и сбрасывается
+    сигналами при изменении справочника. ETag позволяет отвечать 304,
+    а Cache-Control — кэшировать ответ в nginx.
+    '''
+
+    catalogue_name = None
+
+    def get_list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return self.get_list_response(request, *args, **kwargs)
+        query = request.META.get('QUERY_STRING', '')
+        version = cache.get_catalogue_version(self.catalogue_name)
+        cached = cache.get_catalogue_response(
+            self.catalogue_name, version, query)
+        if cached is None:
+            response = self.get_list_response(request, *args, **kwargs)
+            content = JSONRenderer().render(response.data)
+            cached = (quote_etag(hashlib.sha256(content).hexdigest()),
+                      math.ceil(version), content)
+            cache.set_catalogue_response(
+                self.catalogue_name, version, query, cached)
+        return catalogue_response(request, cached)
+
+
+def catalogue_response(request, cached):
+    '''Ответ из закэшированного списка или 304.
+
+    304 отдаётся только по ETag: у Last-Modified точность в секунду, и
+    два изменения за одну секунду дали бы устаревший ответ на
+    If-Modified-Since.
+    '''
+    etag, last_modified, content = cached
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(
+        response, public=True, max_age=settings.CATALOGUE_CACHE_MAX_AGE)
+    return response
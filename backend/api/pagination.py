@@ -0,0 +1,160 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.feed import timeline
+
+
+class KeysetPagination(BasePagination):
+    '''Пагинация по курсору на уникальном составном ключе сортировки.
+
+    Следующая страница выбирается условием «строго после последней
+    строки» по индексу, поэтому нет ни COUNT(*), ни OFFSET, а страницы
+    не теряют и не дублируют строки при одинаковых значениях первого поля.
+    '''
+
+    ordering = ('-name', '-id')
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_position(self, instance):
+        return [getattr(instance, field.lstrip('-'))
+                for field in self.ordering]
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(
+            json.dumps(position, default=str).encode()).decode()
+
+    def decode_cursor(self, request, model):
+        '''Позиция из курсора; значения приводятся к типам полей модели.'''
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+                len(position) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return [self.to_python(model, field, value)
+                for field, value in zip(self.ordering, position)]
+
+    def to_python(self, model, field, value):
+        field = model._meta.get_field(field.lstrip('-'))
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            value = field.to_python(value)
+            field.run_validators(value)
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        if not self.in_range(field, value):
+            raise NotFound(self.invalid_cursor_message)
+        return value
+
+    def in_range(self, field, value):
+        '''Целое в стандартном диапазоне типа поля.
+
+        SQLite не сообщает диапазоны, и валидаторы поля пропускают любое
+        число, а число шире 64 бит драйвер не может передать в запрос.
+        '''
+        bounds = BaseDatabaseOperations.integer_field_ranges.get(
+            field.get_internal_type())
+        if bounds is None or not isinstance(value, int):
+            return True
+        return bounds[0] <= value <= bounds[1]
+
+    def get_position_filter(self, position):
+        '''Строки строго после позиции в порядке сортировки.
+
+        Нестрогая граница по первому полю избыточна, но без неё условие
+        из OR проверяется фильтром, и индекс читается с самого начала,
+        отбрасывая все предыдущие страницы.
+        '''
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        first = self.ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{lookup}': position[0]}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_position = self.get_position(page[-1]) if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class FeedPagination(KeysetPagination):
+    '''Курсор ленты подписок — id последнего рецепта страницы.
+
+    Порядок и состав страницы задаёт лента пользователя, queryset только
+    загружает найденные рецепты. Курсор берётся из ленты, а не из
+    загруженной страницы: рецепт могли удалить после чтения ленты.
+    '''
+
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, queryset.model)
+        before = position[0] if position is not None else None
+        ids = timeline(request.user, before, page_size + 1)
+        self.has_next = len(ids) > page_size
+        page = list(queryset.filter(pk__in=ids[:page_size]).order_by(
+            *self.ordering))
+        self.next_position = [ids[page_size - 1]] if self.has_next else None
+        return page
@@ -7,8 +7,9 @@ class IsAuthororAdminorRead(permissions.BasePermission):
                 or request.method in permissions.SAFE_METHODS)
 
     def has_object_permission(self, request, view, obj):
-        return (request.user.is_staff or obj.author == request.user
-                or request.method in permissions.SAFE_METHODS)
+        return (request.method in permissions.SAFE_METHODS
+                or request.user.is_staff
+                or obj.author_id == request.user.id)
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -1,13 +1,71 @@
 import base64
+import binascii
 import re
+import tempfile
 
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.urls import reverse
 from rest_framework import serializers
-from django.core.files.base import ContentFile
 
+from jobs.models import Job
 from users.models import Follow, User
-from recipes.models import (Favourites, Ingredient, IngredientInRecipe, Recipe,
-                            Shopping_list, Tag)
+from recipes.images import rendition_urls
+from recipes.ingredient_sets import ingredient_sets
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            RecipeDocument, Shopping_list, Tag)
+from recipes.transactions import on_commit_batched
+
+from .membership import get_memberships
+from .utils import get_recipes_limit
+
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_SPOOL_SIZE = 1024 * 1024
+
+
+class Base64ImageField(serializers.ImageField):
+    '''Картинка в base64, декодируемая по частям во временный файл.'''
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:image'):
+            format, imgstr = data.split(';base64,')
+            ext = format.split('/')[-1]
+            if len(imgstr) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+                raise serializers.ValidationError(
+                    'Размер изображения не может превышать '
+                    f'{settings.RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)} МБ')
+            file = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_SIZE)
+            try:
+                for start in range(0, len(imgstr), BASE64_CHUNK_SIZE):
+                    file.write(base64.b64decode(
+                        imgstr[start:start + BASE64_CHUNK_SIZE]))
+            except binascii.Error:
+                file.close()
+                raise serializers.ValidationError(
+                    'Некорректное изображение в base64')
+            file.seek(0)
+            data = File(file, name='image.' + ext)
+
+        return super().to_internal_value(data)
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    '''Ссылки на уменьшенные копии фото рецепта.'''
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        urls = rendition_urls(recipe.image, recipe.renditions_are_ready)
+        request = self.context.get('request')
+        if urls is None or request is None:
+            return urls
+        return {label: {format: request.build_absolute_uri(url)
+                        for format, url in formats.items()}
+                for label, formats in urls.items()}
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -30,10 +88,11 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
+    thumbnails = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -51,9 +110,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Follow.objects.filter(author=obj, user=request.user).exists()
+        return get_memberships(request).contains('follows', obj.id)
 
 
 class CreateUserSerializer(serializers.ModelSerializer):
@@ -95,32 +152,71 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
                                               ' не может быть 0!')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+class AuthorSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = User
+        fields = ['email', 'id', 'username', 'first_name', 'last_name']
+
+
+class RecipeDocumentSerializer(serializers.ModelSerializer):
+    '''Часть рецепта, одинаковая для всех пользователей.
+
+    Сериализуется без запроса, поэтому ссылки на изображения остаются
+    относительными.
+    '''
     tags = TagSerializer(many=True)
-    author = UserSerializer(read_only=True)
+    author = AuthorSerializer()
     ingredients = IngredientInRecipeSerializer(many=True)
+    thumbnails = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'tags', 'author', 'ingredients',
-                  'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time']
+        fields = ['id', 'tags', 'author', 'ingredients', 'name',
+                  'image', 'thumbnails', 'text', 'cooking_time']
 
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Favourites.objects.filter(
-            recipe=obj, user=request.user).exists()
 
-    def get_is_in_shopping_cart(self, obj):
+class RecipeReadSerializer(serializers.BaseSerializer):
+    '''Рецепт из готового документа с флагами текущего пользователя.
+
+    Поля документа из RecipeDocumentSerializer дополняются флагами
+    is_favorited, is_in_shopping_cart и is_subscribed автора. Если
+    документа ещё нет, он собирается на лету.
+    '''
+
+    def to_representation(self, instance):
+        try:
+            document = instance.document.data
+        except RecipeDocument.DoesNotExist:
+            document = RecipeDocumentSerializer(instance).data
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Shopping_list.objects.filter(
-            recipe=obj, user=request.user).exists()
+        memberships = get_memberships(request)
+        author = document['author']
+        return {
+            'id': document['id'],
+            'tags': document['tags'],
+            'author': {**author, 'is_subscribed': memberships.contains(
+                'follows', author['id'])},
+            'ingredients': document['ingredients'],
+            'is_favorited': memberships.contains(
+                'favourites', document['id']),
+            'is_in_shopping_cart': memberships.contains(
+                'shopping_list', document['id']),
+            'name': document['name'],
+            'image': self.absolute_url(document['image']),
+            'thumbnails': document['thumbnails'] and {
+                label: {format: self.absolute_url(url)
+                        for format, url in formats.items()}
+                for label, formats in document['thumbnails'].items()},
+            'text': document['text'],
+            'cooking_time': document['cooking_time'],
+        }
+
+    def absolute_url(self, url):
+        request = self.context.get('request')
+        if url is None or request is None:
+            return url
+        return request.build_absolute_uri(url)
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
@@ -135,16 +231,6 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'measurement_unit', 'amount']
 
 
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
-
-
 class CreateRecipeSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientCreateSerializer(many=True)
     author = UserSerializer(read_only=True)
@@ -152,52 +238,80 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField()
     cooking_time = serializers.IntegerField()
     image = Base64ImageField(required=False, allow_null=True)
+    thumbnails = ImageRenditionsField()
 
     class Meta:
         model = Recipe
         fields = ['id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time']
+                  'image', 'thumbnails', 'text', 'cooking_time']
+
+    def set_ingredients(self, recipe, ingredients, existing=None):
+        '''Запись ингредиентов рецепта пакетными запросами.
+
+        Все id проверяются одним запросом, затем вставляются, обновляются
+        и удаляются только изменившиеся строки. bulk_create и bulk_update
+        не вызывают сигналы, поэтому наборы ингредиентов для ?have=
+        обновляются явно.
+        '''
+        amounts = {data['ingredient']['id']: data['amount']
+                   for data in ingredients}
+        found = Ingredient.objects.in_bulk(amounts)
+        missing = set(amounts) - set(found)
+        if missing:
+            raise serializers.ValidationError({
+                'ingredients': 'Ингредиенты не найдены: '
+                               f'{", ".join(map(str, sorted(missing)))}'})
+        existing = existing or {}
+        removed = set(existing) - set(amounts)
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        changed = []
+        for ingredient_id, item in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe,
+                               ingredient=found[ingredient_id],
+                               amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        )
+        on_commit_batched(ingredient_sets.update, [recipe.pk])
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         instance = super().create(validated_data)
-        for data in ingredients:
-            ingredient = data['ingredient']
-            IngredientInRecipe(
-                recipe=instance,
-                ingredient=get_object_or_404(Ingredient, id=ingredient['id']),
-                amount=data['amount']
-            ).save()
+        self.set_ingredients(instance, ingredients)
         return instance
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
+        ingredients = validated_data.pop('ingredients', None)
         super().update(instance, validated_data)
-        for data in ingredients:
-            ingredient = data['ingredient']
-            IngredientInRecipe(
-                recipe=instance,
-                ingredient=get_object_or_404(Ingredient, id=ingredient['id']),
-                amount=data['amount']
-            ).save()
+        if ingredients is not None:
+            self.set_ingredients(
+                instance, ingredients,
+                existing={item.ingredient_id: item
+                          for item in instance.ingredients.all()})
         return instance
 
+    def to_representation(self, instance):
+        prefetch_related_objects([instance], 'tags', 'ingredients__ingredient')
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Favourites.objects.filter(
-            recipe=obj, user=request.user).exists()
+        return get_memberships(request).contains('favourites', obj.id)
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Shopping_list.objects.filter(
-            recipe=obj, user=request.user
-        ).exists()
+        return get_memberships(request).contains('shopping_list', obj.id)
 
     def validate_cooking_time(self, attrs):
         if attrs < 1:
@@ -219,15 +333,16 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
     def validate_ingredients(self, ingredients):
         if len(ingredients) < 1:
             raise serializers.ValidationError('Добавьте хотя бы 1 ингредиент!')
-        ingredient_in_recipe = []
+        ingredient_in_recipe = set()
         for ingredient in ingredients:
             if int(ingredient.get('amount')) < 1:
                 raise serializers.ValidationError(
                     'Количество ингредиента не может быть 0!')
-            if ingredient in ingredient_in_recipe:
+            ingredient_id = ingredient['ingredient']['id']
+            if ingredient_id in ingredient_in_recipe:
                 raise serializers.ValidationError(
                     'Каждый ингредиент указывается один раз!')
-            ingredient_in_recipe.append(ingredient)
+            ingredient_in_recipe.add(ingredient_id)
         return ingredients
 
     def validate_name(self, name):
@@ -236,18 +351,6 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         return name
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = Recipe
-        fields = (
-            'id',
-            'name',
-            'image',
-            'cooking_time'
-        )
-
-
 class SubscribeSerializer(serializers.ModelSerializer):
 
     id = serializers.IntegerField(
@@ -262,7 +365,8 @@ class SubscribeSerializer(serializers.ModelSerializer):
         source='author.last_name')
     recipes = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.IntegerField(
+        source='author.recipes_count', read_only=True)
 
     class Meta:
         model = Follow
@@ -273,16 +377,21 @@ class SubscribeSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
-        return Follow.objects.filter(
-            author=obj.author, user=request.user).exists()
+        if obj.user_id == request.user.id:
+            return True
+        return get_memberships(request).contains('follows', obj.author_id)
 
     def get_recipes(self, obj):
-        recipes = obj.author.recipe.all()
+        previews = self.context.get('recipes')
+        if previews is not None:
+            recipes = previews.get(obj.author_id, [])
+        else:
+            recipes = obj.author.recipe.all()
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes = recipes[:limit]
         return SubscribeRecipeSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.author.recipe.all().count()
-
 
 class Shopping_cartSerializer(serializers.ModelSerializer):
 
@@ -294,3 +403,37 @@ class Shopping_cartSerializer(serializers.ModelSerializer):
         model = Shopping_list
         fields = ['id', 'name', 'image', 'cooking_time']
         read_only_fields = ('name', 'image', 'cooking_time')
+
+
+class ServingsSerializer(serializers.ModelSerializer):
+    '''Множитель порций рецепта в списке покупок.'''
+
+    class Meta:
+        model = Shopping_list
+        fields = ('servings',)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'kind', 'status', 'attempts', 'error',
+                  'created', 'finished', 'download')
+
+    def get_download(self, obj):
+        '''Ссылка на результат, когда задача выполнена.'''
+        if obj.status != Job.DONE or not obj.result:
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('api:jobs-download', args=(obj.pk,)))
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    '''Список id для пакетных операций.'''
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MUTATION_LIMIT,
+    )
@@ -0,0 +1,138 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from recipes.bulk import ingredients_loaded, memberships_changed
+from recipes.images import renditions_ready
+from recipes.models import (Favourites, Ingredient, IngredientInRecipe,
+                            Recipe, Shopping_list, Tag)
+from recipes.transactions import on_commit_batched
+from users.models import Follow, User
+
+from . import cache, documents, membership
+from .ingredient_index import ingredient_index
+
+MEMBERSHIP_KINDS = {
+    model: kind for kind, (model, _) in membership.KINDS.items()
+}
+
+
+def invalidate_users(user_ids):
+    '''Сброс документов после коммита, чтобы параллельный запрос не
+    закэшировал под новой версией ещё не зафиксированные данные.'''
+    transaction.on_commit(partial(cache.invalidate, user_ids))
+
+
+def invalidate_carts(recipe_ids):
+    '''Сброс документов всех пользователей, у которых рецепты в покупках.'''
+    cache.invalidate(Shopping_list.objects.filter(
+        recipe_id__in=recipe_ids).values_list('user_id', flat=True).distinct())
+
+
+def invalidate_recipe_carts(recipe_id):
+    on_commit_batched(invalidate_carts, [recipe_id])
+
+
+@receiver((post_save, post_delete), sender=Shopping_list)
+def shopping_list_changed(sender, instance, **kwargs):
+    invalidate_users([instance.user_id])
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def ingredient_in_recipe_changed(sender, instance, **kwargs):
+    invalidate_recipe_carts(instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_recipe_carts(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver(ingredients_loaded)
+def ingredient_changed(sender, **kwargs):
+    ingredient_index.invalidate()
+    transaction.on_commit(partial(cache.touch_catalogue, 'ingredients'))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    transaction.on_commit(partial(cache.touch_catalogue, 'tags'))
+
+
+def rebuild_documents(recipe_ids):
+    '''Пересборка документов после коммита; queryset вычисляется там же.'''
+    on_commit_batched(documents.rebuild, recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_document_changed(sender, instance, **kwargs):
+    rebuild_documents([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def recipe_document_ingredients_changed(sender, instance, **kwargs):
+    rebuild_documents([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_document_tags_changed(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if action == 'pre_clear' and reverse:
+        rebuild_documents(list(Recipe.objects.filter(
+            tags=instance).values_list('pk', flat=True)))
+    elif action in ('post_add', 'post_remove'):
+        rebuild_documents(list(pk_set) if reverse else [instance.pk])
+    elif action == 'post_clear' and not reverse:
+        rebuild_documents([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+def tag_document_changed(sender, instance, **kwargs):
+    rebuild_documents(Recipe.objects.filter(
+        tags=instance).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_document_deleted(sender, instance, **kwargs):
+    '''Связи с тегом удаляются без сигналов, поэтому id берутся заранее.'''
+    rebuild_documents(list(Recipe.objects.filter(
+        tags=instance).values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_document_changed(sender, instance, **kwargs):
+    rebuild_documents(Recipe.objects.filter(
+        ingredients__ingredient=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=User)
+def author_document_changed(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    rebuild_documents(instance.recipe.values_list('pk', flat=True))
+
+
+@receiver(renditions_ready)
+def renditions_document_changed(sender, name, **kwargs):
+    documents.rebuild(Recipe.objects.filter(
+        image=name).values_list('pk', flat=True))
+
+
+@receiver((post_save, post_delete), sender=Favourites)
+@receiver((post_save, post_delete), sender=Shopping_list)
+@receiver((post_save, post_delete), sender=Follow)
+def membership_changed(sender, instance, **kwargs):
+    kind = MEMBERSHIP_KINDS[sender]
+    transaction.on_commit(
+        partial(membership.invalidate, kind, instance.user_id))
+
+
+@receiver(memberships_changed)
+def membership_changed_in_bulk(sender, user_id, **kwargs):
+    transaction.on_commit(
+        partial(membership.invalidate, MEMBERSHIP_KINDS[sender], user_id))
+    if sender is Shopping_list:
+        invalidate_users([user_id])
@@ -0,0 +1,13 @@
+from django.core.files import File
+from jobs.queue import task
+
+from .exports import EXPORTERS, render_document
+
+
+@task('export_shopping_cart')
+def export_shopping_cart(job):
+    '''Рендеринг списка покупок в файл результата задачи.'''
+    exporter = EXPORTERS[job.payload['format']]
+    file, size = render_document(job.user, exporter.format)
+    with file:
+        job.result.save(exporter.get_filename(), File(file))
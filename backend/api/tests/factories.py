@@ -0,0 +1,29 @@
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from users.models import User
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, first_name=name,
+        last_name=name, password='password')
+
+
+def create_catalogue(ingredients=5):
+    '''Тег и ingredients ингредиентов в граммах.'''
+    tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+    return tag, [
+        Ingredient.objects.create(name=f'ингредиент {number}',
+                                  measurement_unit='г')
+        for number in range(ingredients)]
+
+
+def create_recipe(author, tag, ingredients, name='Рецепт', amount=10,
+                  cooking_time=5):
+    recipe = Recipe.objects.create(author=author, name=name, text='Текст',
+                                   cooking_time=cooking_time)
+    recipe.tags.set([tag])
+    IngredientInRecipe.objects.bulk_create(
+        IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                           amount=amount)
+        for ingredient in ingredients)
+    return recipe
@@ -0,0 +1,89 @@
+from types import FunctionType
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+
+from api import async_views, urls
+from recipes.models import Recipe
+
+from .factories import create_catalogue, create_recipe, create_user
+
+urlpatterns = [
+    path('api/', include([
+        path('recipes/', async_views.recipe_list_view),
+        path('recipes/<int:pk>/', async_views.recipe_detail_view),
+    ] + urls.urlpatterns)),
+]
+# Цепочка как в foodgram/asgi.py, без debug toolbar.
+ASGI_MIDDLEWARE = [middleware for middleware in settings.MIDDLEWARE
+                   if not middleware.startswith('debug_toolbar')]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncReadViewsTest(TestCase):
+    '''Запись через маршруты async-вьюх проходит без CSRF-токена.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.author = create_user('author')
+            cls.tag, cls.ingredients = create_catalogue()
+            cls.recipe = create_recipe(cls.author, cls.tag, cls.ingredients)
+        cls.token = Token.objects.create(user=cls.author)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = Client(enforce_csrf_checks=True,
+                             HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_read(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_create(self):
+        response = self.client.post(
+            '/api/recipes/', {
+                'name': 'Новый рецепт', 'text': 'Текст', 'cooking_time': 5,
+                'tags': [self.tag.pk],
+                'ingredients': [{'id': self.ingredients[0].pk,
+                                 'amount': 10}]},
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_update_and_delete(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        response = self.client.patch(url, {'name': 'Другое название'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(Recipe.objects.exists())
+
+
+@override_settings(ROOT_URLCONF=__name__, MIDDLEWARE=ASGI_MIDDLEWARE,
+                   METRICS_SAMPLE_RATE=1)
+class AsyncInstrumentationTest(TestCase):
+    '''Замеры не переводят цепочку ASGI в поток и видят SQL вьюхи.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            author = create_user('author')
+            tag, ingredients = create_catalogue()
+            create_recipe(author, tag, ingredients)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    async def test_chain_stays_async(self):
+        client = AsyncClient()
+        response = await client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(client.handler._middleware_chain, FunctionType)
+        self.assertRegex(response['Server-Timing'],
+                         r'desc="[1-9]\d* queries"')
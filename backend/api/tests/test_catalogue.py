@@ -0,0 +1,34 @@
+from unittest import mock
+
+from django.core.cache import caches
+from recipes.models import Tag
+from rest_framework.test import APITestCase
+
+URL = '/api/tags/'
+
+
+class CatalogueCacheTest(APITestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+
+    def test_etag_not_modified(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(URL, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_within_one_second(self):
+        with mock.patch('api.cache.time.time', return_value=1000.2):
+            first = self.client.get(URL)
+        with mock.patch('api.cache.time.time', return_value=1000.7):
+            with self.captureOnCommitCallbacks(execute=True):
+                Tag.objects.create(name='Обед', slug='lunch')
+        second = self.client.get(
+            URL, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.json()), 2)
+        self.assertEqual(second['Last-Modified'], first['Last-Modified'])
+        stale = self.client.get(URL, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(stale.status_code, 200)
@@ -0,0 +1,59 @@
+from recipes.models import Favourites, Recipe
+from rest_framework.test import APITestCase
+from users.models import Follow, User
+
+from .factories import create_catalogue, create_recipe, create_user
+
+
+class CounterFieldsTest(APITestCase):
+    '''Сохранение устаревшего экземпляра не затирает счётчики.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.tag, cls.ingredients = create_catalogue()
+        cls.recipe = create_recipe(cls.author, cls.tag, cls.ingredients)
+
+    def test_stale_recipe_save(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        Favourites.objects.create(user=self.reader, recipe=self.recipe)
+        stale.name = 'Новое название'
+        stale.save()
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favourites_count, 1)
+
+    def test_stale_user_save(self):
+        stale = User.objects.get(pk=self.author.pk)
+        Follow.objects.create(user=self.reader, author=self.author)
+        stale.first_name = 'Имя'
+        stale.save()
+        author = User.objects.get(pk=self.author.pk)
+        self.assertEqual(author.first_name, 'Имя')
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(author.recipes_count, 1)
+
+    def test_recipe_patch_keeps_counters(self):
+        Favourites.objects.create(user=self.reader, recipe=self.recipe)
+        Recipe.objects.filter(pk=self.recipe.pk).update(in_carts_count=7)
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {'name': 'Другое название', 'text': 'Текст', 'cooking_time': 10,
+             'tags': [self.tag.pk],
+             'ingredients': [{'id': self.ingredients[0].pk, 'amount': 5}]},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.cooking_time, 10)
+        self.assertEqual(recipe.favourites_count, 1)
+        self.assertEqual(recipe.in_carts_count, 7)
+
+    def test_stale_recipe_save_keeps_scores(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            popularity=1.5, trending=2.5)
+        stale.save()
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual((recipe.popularity, recipe.trending), (1.5, 2.5))
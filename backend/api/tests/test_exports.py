@@ -0,0 +1,62 @@
+import json
+
+from api import cache
+from django.core.cache import caches
+from django.http import StreamingHttpResponse
+from recipes.models import Shopping_list
+from rest_framework.test import APITestCase
+
+from .factories import create_catalogue, create_recipe, create_user
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingCartExportTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        tag, ingredients = create_catalogue()
+        for number in range(3):
+            Shopping_list.objects.create(user=cls.user, recipe=create_recipe(
+                cls.user, tag, ingredients, name=f'Рецепт {number}'))
+
+    def setUp(self):
+        caches['shopping_cart'].clear()
+        self.client.force_authenticate(self.user)
+
+    def test_text_formats_stream_on_miss_and_cache(self):
+        for format in ('txt', 'csv', 'json'):
+            with self.subTest(format=format):
+                response = self.client.get(URL, {'format': format})
+                self.assertIsInstance(response, StreamingHttpResponse)
+                content = b''.join(response.streaming_content)
+                cached = self.client.get(URL, {'format': format})
+                self.assertEqual(cached.content, content)
+                self.assertEqual(cached['ETag'], response['ETag'])
+                not_modified = self.client.get(
+                    URL, {'format': format},
+                    HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(not_modified.status_code, 304)
+
+    def test_version_does_not_repeat_after_eviction(self):
+        response = self.client.get(URL, {'format': 'txt'})
+        b''.join(response.streaming_content)
+        caches['shopping_cart'].clear()
+        cache.invalidate([self.user.pk])
+        b''.join(self.client.get(URL, {'format': 'txt'}).streaming_content)
+        response = self.client.get(URL, {'format': 'txt'},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_pdf_has_etag_on_miss(self):
+        response = self.client.get(URL, {'format': 'pdf'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_aggregated_amounts(self):
+        response = self.client.get(URL, {'format': 'json'})
+        lines = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0]['amount'], 30)
@@ -0,0 +1,65 @@
+import base64
+import json
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import caches
+from django.test import override_settings
+from jobs.models import Job
+from jobs.queue import claim, execute
+from recipes.feed import timeline
+from recipes.models import FeedEntry
+from rest_framework.test import APITestCase
+from users.models import Follow
+
+from .factories import create_catalogue, create_recipe, create_user
+
+URL = '/api/recipes/feed/'
+
+
+def cursor(link):
+    encoded = parse_qs(urlparse(link).query)['cursor'][0]
+    return json.loads(base64.urlsafe_b64decode(encoded))
+
+
+class FeedTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.reader = create_user('reader')
+            cls.other = create_user('other')
+            cls.author = create_user('author')
+            cls.tag, cls.ingredients = create_catalogue(1)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_next_cursor_when_page_recipes_are_gone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.author, self.tag, self.ingredients)
+        self.client.force_authenticate(self.reader)
+        ids = [recipe.pk + 2, recipe.pk + 1, recipe.pk]
+        with mock.patch('api.pagination.timeline', return_value=ids):
+            response = self.client.get(f'{URL}?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+        self.assertEqual(cursor(response.json()['next']), [recipe.pk + 1])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_backfill_when_author_drops_below_fanout_limit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=self.reader, author=self.author)
+            Follow.objects.create(user=self.other, author=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.author, self.tag, self.ingredients)
+        self.assertFalse(FeedEntry.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(user=self.other).delete()
+        self.assertEqual(timeline(self.reader), [])
+        job = Job.objects.get(kind='backfill_feeds')
+        self.assertEqual(claim(1), [job.pk])
+        self.assertTrue(execute(job.pk))
+        self.assertEqual(timeline(self.reader), [recipe.pk])
+        self.assertFalse(FeedEntry.objects.filter(user=self.other).exists())
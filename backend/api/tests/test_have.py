@@ -0,0 +1,54 @@
+from django.core.cache import caches
+from recipes.ingredient_sets import ingredient_sets
+from rest_framework.test import APITestCase
+
+from .factories import create_catalogue, create_recipe, create_user
+
+
+class HaveFilterTest(APITestCase):
+    '''Рецепты с пакетно записанными ингредиентами сразу видны в ?have=.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.author = create_user('author')
+            cls.tag, cls.ingredients = create_catalogue()
+            cls.recipe = create_recipe(cls.author, cls.tag,
+                                       cls.ingredients[:1])
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        ingredient_sets.build()
+        self.client.force_authenticate(self.author)
+
+    def have(self, *ingredients):
+        ids = ','.join(str(ingredient.pk) for ingredient in ingredients)
+        response = self.client.get(f'/api/recipes/?have={ids}')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    def payload(self, *ingredients):
+        return {
+            'name': 'Новый рецепт', 'text': 'Текст', 'cooking_time': 5,
+            'tags': [self.tag.pk],
+            'ingredients': [{'id': ingredient.pk, 'amount': 10}
+                            for ingredient in ingredients]}
+
+    def test_created_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/', self.payload(*self.ingredients[1:3]),
+                format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(response.json()['id'],
+                      self.have(*self.ingredients[1:3]))
+
+    def test_updated_ingredients(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/',
+                self.payload(self.ingredients[3]), format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.recipe.pk, self.have(self.ingredients[3]))
+        self.assertNotIn(self.recipe.pk, self.have(self.ingredients[0]))
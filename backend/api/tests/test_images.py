@@ -0,0 +1,78 @@
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from recipes.images import (ContentAddressedStorage, rendition_name,
+                            renditions_ready)
+from recipes.models import Recipe
+from rest_framework.test import APITestCase
+from users.models import Follow
+
+from .factories import create_catalogue, create_recipe, create_user
+
+IMAGE = 'recipe/' + 'a' * 64 + '.png'
+
+
+class ContentAddressedStorageTest(APITestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def test_identical_uploads_share_name(self):
+        first = self.storage.save('recipe/image.png', ContentFile(b'data'))
+        second = self.storage.save('recipe/other.png', ContentFile(b'data'))
+        self.assertEqual(first, second)
+
+    def test_race_with_identical_upload(self):
+        '''Файл появился между exists() и записью.'''
+        name = self.storage.save('recipe/image.png', ContentFile(b'data'))
+        with mock.patch.object(ContentAddressedStorage, 'exists',
+                               side_effect=[False, True]):
+            again = self.storage.save('recipe/image.png',
+                                      ContentFile(b'data'))
+        self.assertEqual(again, name)
+
+
+class RenditionUrlsTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.reader = create_user('reader')
+            cls.author = create_user('author')
+            tag, ingredients = create_catalogue()
+            cls.recipe = create_recipe(cls.author, tag, ingredients)
+            Follow.objects.create(user=cls.reader, author=cls.author)
+        Recipe.objects.filter(pk=cls.recipe.pk).update(image=IMAGE)
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def thumbnail(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        recipe = results[0]['recipes'][0] if 'recipes' in results[0] else (
+            results[0])
+        return recipe['thumbnails']['thumbnail']['webp']
+
+    def test_original_until_ready_without_stat(self):
+        with mock.patch.object(ContentAddressedStorage, 'exists') as exists:
+            url = self.thumbnail('/api/users/subscriptions/')
+        exists.assert_not_called()
+        self.assertTrue(url.endswith(IMAGE))
+
+    def test_ready_signal_marks_recipe_and_document(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            renditions_ready.send(sender=ContentAddressedStorage, name=IMAGE)
+        self.assertEqual(Recipe.objects.get(pk=self.recipe.pk)
+                         .renditions_image, IMAGE)
+        expected = rendition_name(IMAGE, 300, 'webp')
+        with mock.patch.object(ContentAddressedStorage, 'exists') as exists:
+            self.assertTrue(self.thumbnail(
+                '/api/users/subscriptions/').endswith(expected))
+            self.assertTrue(self.thumbnail('/api/recipes/').endswith(
+                expected))
+        exists.assert_not_called()
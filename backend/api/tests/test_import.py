@@ -0,0 +1,91 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.cache import caches
+from django.core.management import call_command
+from recipes.ingredient_sets import ingredient_sets
+from recipes.models import Recipe
+from rest_framework.test import APITestCase
+
+from .factories import create_catalogue, create_user
+
+
+class ImportRecipesTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.author = create_user('author')
+            cls.tag, cls.ingredients = create_catalogue(1)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        ingredient_sets.build()
+
+    def record(self, name, cooking_time=5, amount=10):
+        ingredient = self.ingredients[0]
+        return {'author': self.author.email, 'name': name, 'text': 'Текст',
+                'cooking_time': cooking_time, 'tags': [self.tag.slug],
+                'ingredients': [[ingredient.name,
+                                 ingredient.measurement_unit, amount]]}
+
+    def import_text(self, text, name='recipes.jsonl'):
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / name
+            path.write_text(text, encoding='utf-8')
+            call_command('import_recipes', str(path), stdout=output)
+        return output.getvalue()
+
+    def import_records(self, *records):
+        return self.import_text('\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records))
+
+    def test_out_of_range_rows_are_skipped(self):
+        self.import_records(
+            self.record('Быстрый', cooking_time=0),
+            self.record('Долгий', cooking_time=721),
+            self.record('Много', amount=10001),
+            self.record('Пустой', cooking_time=None),
+            self.record('Обычный'))
+        self.assertEqual(
+            list(Recipe.objects.values_list('name', flat=True)),
+            ['Обычный'])
+
+    def test_malformed_jsonl_lines_are_skipped(self):
+        output = self.import_text('\n'.join((
+            json.dumps(self.record('Первый'), ensure_ascii=False),
+            '{"name": ',
+            '["не", "объект"]',
+            json.dumps(self.record('Второй'), ensure_ascii=False))))
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('name', flat=True)),
+            ['Второй', 'Первый'])
+        self.assertIn('пропущено 2', output)
+        self.assertIn('Пропущены строки: 2, 3.', output)
+
+    def test_malformed_csv_rows_are_skipped(self):
+        ingredient = self.ingredients[0]
+        ingredients = json.dumps(
+            [[ingredient.name, ingredient.measurement_unit, 10]],
+            ensure_ascii=False).replace('"', '""')
+        output = self.import_text('\n'.join((
+            'name,text,cooking_time,author,tags,ingredients',
+            f'Первый,Текст,5,{self.author.email},{self.tag.slug},'
+            f'"{ingredients}"',
+            f'Испорченный,Текст,5,{self.author.email},{self.tag.slug},[1,',
+            f'Короткий,Текст,5,{self.author.email}',
+        )) + '\n', name='recipes.csv')
+        self.assertEqual(
+            list(Recipe.objects.values_list('name', flat=True)), ['Первый'])
+        self.assertIn('Пропущены строки: 3, 4.', output)
+
+    def test_imported_recipes_match_have(self):
+        self.import_records(self.record('Обычный'))
+        recipe = Recipe.objects.get()
+        self.assertEqual(
+            ingredient_sets.match({self.ingredients[0].pk}, 1.0),
+            [recipe.pk])
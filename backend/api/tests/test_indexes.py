@@ -0,0 +1,89 @@
+from unittest import skipUnless
+
+from api.pagination import KeysetPagination
+from django.db import connection
+from django.test import TestCase
+from recipes.models import Favourites, Ingredient, Recipe
+from users.models import User
+
+RECIPES = 4000
+AUTHORS = 200
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN только на PostgreSQL')
+class IndexUsageTest(TestCase):
+    '''Горячие запросы используют индексы из миграций и Meta.
+
+    Последовательное чтение отключено, чтобы на небольшом наборе данных
+    проверка не зависела от оценки стоимости планировщиком.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create(
+            User(email=f'user{number}@example.com', username=f'user{number}',
+                 first_name='Имя', last_name='Фамилия')
+            for number in range(AUTHORS))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(RECIPES))
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(author=cls.users[number % AUTHORS],
+                   name=f'Рецепт {number}',
+                   text='Текст', cooking_time=5, popularity=number % 97)
+            for number in range(RECIPES))
+        Favourites.objects.bulk_create(
+            Favourites(user=user, recipe=recipe)
+            for user in cls.users[:20] for recipe in cls.recipes[:50])
+        with connection.cursor() as cursor:
+            for model in (User, Ingredient, Recipe, Favourites):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, plan)
+
+    def test_ingredient_prefix(self):
+        self.assertUsesIndex(
+            Ingredient.objects.filter(name__startswith='ингредиент 1'),
+            'ingredient_name_prefix_idx')
+
+    def test_ingredient_contains(self):
+        self.assertUsesIndex(
+            Ingredient.objects.filter(name__icontains='диент 12'),
+            'ingredient_name_trgm_idx')
+
+    def test_recipes_by_author(self):
+        self.assertUsesIndex(
+            Recipe.objects.filter(author=self.users[1]).order_by(
+                '-name', '-id')[:6],
+            'recipe_author_name_id_idx')
+
+    def test_recipes_by_author_newest(self):
+        self.assertUsesIndex(
+            Recipe.objects.filter(author=self.users[1]).order_by('-id')[:6],
+            'recipe_author_id_idx')
+
+    def test_recipes_after_cursor(self):
+        '''Индекс читается с позиции курсора, а не с начала.'''
+        pagination = KeysetPagination()
+        recipe = self.recipes[RECIPES // 2]
+        queryset = Recipe.objects.filter(pagination.get_position_filter(
+            pagination.get_position(recipe))).order_by('-name', '-id')[:6]
+        self.assertUsesIndex(queryset, 'recipe_name_id_idx')
+        self.assertIn('Index Cond', queryset.explain())
+
+    def test_popular_recipes(self):
+        self.assertUsesIndex(
+            Recipe.objects.order_by('-popularity', '-id')[:6],
+            'recipe_popularity_id_idx')
+
+    def test_favourite_flag(self):
+        self.assertUsesIndex(
+            Favourites.objects.filter(user=self.users[1],
+                                      recipe=self.recipes[0]),
+            'recipes_favourites_unique_user_recipe')
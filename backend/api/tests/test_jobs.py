@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from jobs.models import Job
+from jobs.queue import claim, heartbeat
+
+
+class JobQueueTest(TestCase):
+
+    def running_job(self, attempts, locked_for):
+        return Job.objects.create(
+            kind='export', status=Job.RUNNING, attempts=attempts,
+            max_attempts=3,
+            locked_until=timezone.now() + timedelta(seconds=locked_for))
+
+    def test_abandoned_job_is_claimed_again(self):
+        job = self.running_job(attempts=1, locked_for=-1)
+        self.assertEqual(claim(10), [job.pk])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertGreater(job.locked_until, timezone.now())
+
+    def test_abandoned_job_without_attempts_fails(self):
+        job = self.running_job(attempts=3, locked_for=-1)
+        self.assertEqual(claim(10), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNone(job.locked_until)
+        self.assertIsNotNone(job.finished)
+
+    def test_heartbeat_keeps_job_locked(self):
+        job = self.running_job(attempts=1, locked_for=1)
+        heartbeat([job.pk])
+        job.refresh_from_db()
+        self.assertGreater(job.locked_until,
+                           timezone.now() + timedelta(seconds=60))
+        self.assertEqual(claim(10), [])
+
+    def test_heartbeat_skips_finished_jobs(self):
+        job = self.running_job(attempts=1, locked_for=1)
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE,
+                                             locked_until=None)
+        self.assertEqual(heartbeat([job.pk]), 0)
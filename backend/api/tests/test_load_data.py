@@ -0,0 +1,48 @@
+import io
+import tempfile
+from pathlib import Path
+from unittest import skipUnless
+
+from api import cache
+from api.ingredient_index import ingredient_index
+from django.core.management import call_command
+from django.db import connection
+from recipes.models import Ingredient
+from rest_framework.test import APITestCase
+
+
+class LoadDataTest(APITestCase):
+
+    def load(self, rows, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'ingredients.csv'
+            path.write_text(''.join(f'{name},{unit}\n' for name, unit in rows),
+                            encoding='utf-8')
+            call_command('load_data', str(path), '--batch-size', '2', *args,
+                         stdout=io.StringIO())
+
+    def test_rerun_skips_loaded_rows(self):
+        rows = [(f'ингредиент {number}', 'г') for number in range(5)]
+        self.load(rows)
+        self.load(rows + [('новый', 'шт.')])
+        self.assertEqual(Ingredient.objects.count(), 6)
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY только на PostgreSQL')
+    def test_copy_table_is_cleared_between_batches(self):
+        '''Тест идёт в транзакции, как и вызов из другой команды.'''
+        self.load([(f'ингредиент {number}', 'г') for number in range(5)])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM ingredient_load')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_new_rows_invalidate_catalogue(self):
+        self.load([('ингредиент', 'г')])
+        version = cache.get_catalogue_version('ingredients')
+        ingredient_index.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.load([('ингредиент', 'г'), ('новый', 'шт.')])
+        self.assertNotEqual(cache.get_catalogue_version('ingredients'),
+                            version)
+        self.assertEqual(
+            [item['name'] for item in ingredient_index.search('нов')],
+            ['новый'])
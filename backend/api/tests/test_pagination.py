@@ -0,0 +1,61 @@
+import base64
+import json
+
+from rest_framework.test import APITestCase
+
+from .factories import create_catalogue, create_recipe, create_user
+
+
+def cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+class KeysetPaginationTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            author = create_user('author')
+            tag, ingredients = create_catalogue()
+            cls.recipes = [
+                create_recipe(author, tag, ingredients,
+                              name=f'Рецепт {number % 3}')
+                for number in range(8)]
+
+    def test_pages_do_not_overlap(self):
+        url, seen = '/api/recipes/?cursor=&limit=3', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(recipe['id'] for recipe in response.json()['results'])
+            url = response.json()['next']
+        self.assertEqual(sorted(seen), sorted(r.pk for r in self.recipes))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_invalid_cursor(self):
+        for value in ('not-base64!', cursor({'name': 'x'}), cursor(['x']),
+                      cursor(['x', 'abc']), cursor(['x', None]),
+                      cursor(['x', [1]]), cursor(['x', 2 ** 63]),
+                      cursor(['x', 10 ** 30])):
+            with self.subTest(cursor=value):
+                response = self.client.get('/api/recipes/',
+                                           {'cursor': value})
+                self.assertEqual(response.status_code, 404)
+
+    def test_invalid_ordering_cursor(self):
+        response = self.client.get(
+            '/api/recipes/',
+            {'cursor': cursor(['popular', 1]), 'ordering': 'popular'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            '/api/recipes/',
+            {'cursor': cursor([0.5, '7']), 'ordering': 'popular'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_feed_cursor(self):
+        self.client.force_authenticate(create_user('reader'))
+        for value in (cursor(['abc']), cursor([None]), cursor([2 ** 40])):
+            with self.subTest(cursor=value):
+                response = self.client.get('/api/recipes/feed/',
+                                           {'cursor': value})
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,97 @@
+from unittest import mock, skipUnless
+
+from api.views import RecipeViewSet
+from django.core.cache import caches
+from django.db import connection
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APITestCase
+from recipes.models import Favourites, Shopping_list
+from users.models import Follow
+
+from .factories import create_catalogue, create_recipe, create_user
+
+
+class LimitPagination(PageNumberPagination):
+    '''Размер страницы из ?limit=, чтобы сравнить страницы разной длины.'''
+
+    page_size_query_param = 'limit'
+
+
+@mock.patch.object(RecipeViewSet, 'pagination_class', LimitPagination)
+class RecipeQueriesTest(APITestCase):
+    '''Число запросов к рецептам не зависит от числа рецептов на странице.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.user = create_user('reader')
+            cls.author = create_user('author')
+            cls.tag, cls.ingredients = create_catalogue()
+            cls.recipes = [
+                create_recipe(cls.author, cls.tag, cls.ingredients,
+                              name=f'Рецепт {number}')
+                for number in range(6)]
+            Follow.objects.create(user=cls.user, author=cls.author)
+            Favourites.objects.create(user=cls.user, recipe=cls.recipes[0])
+            Shopping_list.objects.create(user=cls.user,
+                                         recipe=cls.recipes[0])
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def add_recipes(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(count):
+                create_recipe(self.author, self.tag, self.ingredients,
+                              name=f'Ещё рецепт {number}')
+
+    def assertQueries(self, number, url, authenticated=False):
+        if authenticated:
+            self.client.force_authenticate(self.user)
+        with self.assertNumQueries(number):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_anonymous_list(self):
+        data = self.assertQueries(2, '/api/recipes/')
+        self.assertEqual(len(data['results']), 6)
+        self.add_recipes(10)
+        data = self.assertQueries(2, '/api/recipes/?limit=20')
+        self.assertEqual(len(data['results']), 16)
+
+    def test_authenticated_list(self):
+        data = self.assertQueries(5, '/api/recipes/', authenticated=True)
+        favourite = next(recipe for recipe in data['results']
+                         if recipe['id'] == self.recipes[0].pk)
+        self.assertTrue(favourite['is_favorited'])
+        self.assertTrue(favourite['is_in_shopping_cart'])
+        self.assertTrue(favourite['author']['is_subscribed'])
+        self.add_recipes(10)
+        caches['default'].clear()
+        data = self.assertQueries(5, '/api/recipes/?limit=20',
+                                  authenticated=True)
+        self.assertEqual(len(data['results']), 16)
+
+    def test_authenticated_list_cached_memberships(self):
+        self.assertQueries(5, '/api/recipes/', authenticated=True)
+        self.assertQueries(2, '/api/recipes/', authenticated=True)
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'поиск в памяти на других базах')
+    def test_anonymous_search(self):
+        data = self.assertQueries(3, '/api/recipes/?search=рецепт')
+        self.assertEqual(data['count'], 6)
+        self.add_recipes(10)
+        data = self.assertQueries(3, '/api/recipes/?search=рецепт&limit=20')
+        self.assertEqual(data['count'], 16)
+        self.assertEqual(len(data['results']), 16)
+
+    def test_anonymous_detail(self):
+        self.assertQueries(1, f'/api/recipes/{self.recipes[0].pk}/')
+
+    def test_authenticated_detail(self):
+        data = self.assertQueries(
+            4, f'/api/recipes/{self.recipes[0].pk}/', authenticated=True)
+        self.assertTrue(data['is_favorited'])
@@ -0,0 +1,19 @@
+from django.test import SimpleTestCase
+from recipes.units import humanize
+
+
+class HumanizeTest(SimpleTestCase):
+
+    def test_whole_and_half_units(self):
+        self.assertEqual(humanize(2000, 'г'), (2, 'кг'))
+        self.assertEqual(humanize(1500, 'г'), (1.5, 'кг'))
+        self.assertEqual(humanize(6, 'ч. л.'), (2, 'ст. л.'))
+        self.assertEqual(humanize(4.5, 'ч. л.'), (1.5, 'ст. л.'))
+
+    def test_fractions_keep_base_unit(self):
+        self.assertEqual(humanize(4, 'ч. л.'), (4, 'ч. л.'))
+        self.assertEqual(humanize(1250, 'г'), (1250, 'г'))
+        self.assertEqual(humanize(333.3333, 'мл'), (333.333, 'мл'))
+
+    def test_unknown_unit(self):
+        self.assertEqual(humanize(3, 'шт.'), (3, 'шт.'))
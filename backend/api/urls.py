@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (Favourites, IngredientViewSet, RecipeViewSet,
+from .views import (BulkFavourites, BulkShopping_list, BulkSubscribe,
+                    Favourites, IngredientViewSet, JobViewSet, RecipeViewSet,
                     Shopping_listViews, Subscribe, SubscriptionsViews,
                     TagViewSet)
 
@@ -13,9 +15,22 @@ router_v1 = DefaultRouter()
 router_v1.register('tags', TagViewSet, basename='tags')
 router_v1.register('recipes', RecipeViewSet, basename='recipes')
 router_v1.register('ingredients', IngredientViewSet, basename='ingredients')
+router_v1.register('jobs', JobViewSet, basename='jobs')
 
 
 urlpatterns = [
+    path(
+        'recipes/shopping_cart/',
+        BulkShopping_list.as_view(),
+        name='bulk_shopping_cart'),
+    path(
+        'recipes/favorite/',
+        BulkFavourites.as_view(),
+        name='bulk_favourites'),
+    path(
+        'users/subscribe/',
+        BulkSubscribe.as_view(),
+        name='bulk_subscribe'),
     path('', include(router_v1.urls)),
     path(
         'recipes/<int:recipe_id>/shopping_cart/',
@@ -37,3 +52,14 @@ urlpatterns = [
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list_view),
+        path('recipes/<int:pk>/', async_views.recipe_detail_view),
+        path('tags/', async_views.tag_list_view),
+        path('ingredients/', async_views.ingredient_list_view),
+        path('users/subscriptions/', async_views.subscriptions_view),
+    ] + urlpatterns
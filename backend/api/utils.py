@@ -1,5 +1,15 @@
+from django.conf import settings
 from django_filters.rest_framework import CharFilter, FilterSet, filters
+from recipes.ingredient_sets import ingredient_sets, parse_match
 from recipes.models import Ingredient, Recipe, Tag, User
+from recipes.search import filter_in_order, search_recipes
+from rest_framework.exceptions import ValidationError
+
+# Порядки ?ordering=: оценки пересчитывает команда fold_popularity.
+RECIPE_ORDERINGS = {
+    'popular': ('-popularity', '-id'),
+    'trending': ('-trending', '-id'),
+}
 
 
 class RecipeFilter(FilterSet):
@@ -15,10 +25,14 @@ class RecipeFilter(FilterSet):
         method='get_is_in_shopping_cart'
     )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    search = CharFilter(method='get_search')
+    have = CharFilter(method='get_have')
+    ordering = CharFilter(method='get_ordering')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'have', 'ordering')
 
     def get_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -30,6 +44,34 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shopping_list__user=self.request.user)
         return queryset
 
+    def get_search(self, queryset, name, value):
+        '''Полнотекстовый поиск, результаты упорядочены по релевантности.'''
+        return search_recipes(queryset, value)
+
+    def get_have(self, queryset, name, value):
+        '''Рецепты из имеющихся ингредиентов, по убыванию покрытия.
+
+        Режим задаётся параметром ?match=: all, any или coverage>=x.
+        '''
+        try:
+            have = {int(pk) for pk in value.split(',') if pk.strip()}
+        except ValueError:
+            raise ValidationError({'have': 'Ожидаются id ингредиентов '
+                                           'через запятую.'})
+        min_coverage = parse_match(self.data.get('match'))
+        if min_coverage is None:
+            raise ValidationError({'match': 'Допустимо all, any или '
+                                            'coverage>=x, где 0 <= x <= 1.'})
+        return filter_in_order(queryset, ingredient_sets.match(
+            have, min_coverage, limit=settings.RECIPE_MATCH_LIMIT))
+
+    def get_ordering(self, queryset, name, value):
+        '''Порядок по популярности: popular или trending.'''
+        if value not in RECIPE_ORDERINGS:
+            raise ValidationError({'ordering': 'Допустимо '
+                                   f'{", ".join(RECIPE_ORDERINGS)}.'})
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
 
 class IngredientFilter(FilterSet):
     name = CharFilter(lookup_expr='startswith')
@@ -37,3 +79,21 @@ class IngredientFilter(FilterSet):
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+
+def get_positive_int(request, name):
+    '''Неотрицательное целое из параметра запроса или None.
+
+    Принимает и запрос DRF, и обычный HttpRequest async-представлений.
+    '''
+    params = getattr(request, 'query_params', request.GET)
+    try:
+        value = int(params.get(name))
+    except (TypeError, ValueError):
+        return None
+    return max(value, 0)
+
+
+def get_recipes_limit(request):
+    '''Ограничение числа рецептов в превью подписки из ?recipes_limit=.'''
+    return get_positive_int(request, 'recipes_limit')
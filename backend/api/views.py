@@ -1,40 +1,56 @@
-import io
+import os
+from collections import defaultdict
 
-from django.db.models.aggregates import Sum
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from django.http import FileResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from jobs.models import Job
+from jobs.queue import enqueue
+from recipes import bulk
+from recipes.models import Ingredient, Recipe, Tag
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.permissions import (SAFE_METHODS, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import Follow, User
 
+from . import cache, membership
+from .exports import (DEFAULT_FORMAT, EXPORTERS, export_shopping_cart,
+                      get_shopping_cart, shopping_cart_lines)
+from .ingredient_index import ingredient_index
+from .mixins import CachedListMixin
+from .pagination import FeedPagination, KeysetPagination
 from .permissions import IsAdminOrReadOnly, IsAuthororAdminorRead
-from .serializers import (CreateRecipeSerializer, FavouriteSerializer,
-                          IngredientSerializer, RecipeSerializer,
+from .serializers import (BulkIdsSerializer, CreateRecipeSerializer,
+                          FavouriteSerializer, IngredientSerializer,
+                          JobSerializer,
+                          RecipeReadSerializer, ServingsSerializer,
                           Shopping_cartSerializer, SubscribeSerializer,
                           TagSerializer)
-from .utils import IngredientFilter, RecipeFilter
+from .utils import (RECIPE_ORDERINGS, IngredientFilter, RecipeFilter,
+                    get_positive_int, get_recipes_limit)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CachedListMixin, viewsets.ModelViewSet):
     '''Вьюсет для Тегов.'''
 
+    catalogue_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CachedListMixin, viewsets.ModelViewSet):
     '''Вьюсет для Ингредиентов.'''
 
+    catalogue_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly, )
@@ -42,6 +58,14 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, ]
     filterset_class = IngredientFilter
 
+    def get_list_response(self, request, *args, **kwargs):
+        '''Поиск по названию обслуживается индексом в памяти.'''
+        name = request.query_params.get('name')
+        if name is None:
+            return super().get_list_response(request, *args, **kwargs)
+        return Response(ingredient_index.search(
+            name, limit=get_positive_int(request, 'limit')))
+
 
 class Favourites(generics.RetrieveDestroyAPIView, generics.ListCreateAPIView):
     '''Вью для добавления и удаления рецепта в избранное.'''
@@ -57,6 +81,9 @@ class Favourites(generics.RetrieveDestroyAPIView, generics.ListCreateAPIView):
     def create(self, request, *args, **kwargs):
         '''Добавление в избранное.'''
         recipe = self.get_object()
+        if request.user.favourites.filter(recipe=recipe).exists():
+            return Response('Рецепт уже в избранном!',
+                            status=status.HTTP_400_BAD_REQUEST)
         favorite = request.user.favourites.create(recipe=recipe)
         serializer = self.get_serializer(favorite)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -70,63 +97,101 @@ class RecipeViewSet(viewsets.ModelViewSet):
     '''Вьюсет для рецептов.'''
 
     queryset = Recipe.objects.all()
-    serializer_class = RecipeSerializer
+    serializer_class = RecipeReadSerializer
     filter_backends = [DjangoFilterBackend, ]
     filterset_class = RecipeFilter
     pagination_class = PageNumberPagination
     permission_classes = (IsAuthororAdminorRead, )
 
+    @property
+    def paginator(self):
+        '''Курсорная пагинация включается параметром ?cursor=.'''
+        if not hasattr(self, '_paginator'):
+            if KeysetPagination.cursor_query_param in (
+                    self.request.query_params):
+                self._paginator = KeysetPagination()
+                ordering = self.request.query_params.get('ordering')
+                if ordering in RECIPE_ORDERINGS:
+                    self._paginator.ordering = RECIPE_ORDERINGS[ordering]
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        '''Рецепты со связями за постоянное число запросов.
+
+        Чтение идёт из готовых документов, связи нужны только для записи.
+        При поиске документы загружаются отдельным запросом: с JOIN
+        PostgreSQL сортирует на диске все совпадения целиком, а без него
+        выбирает первые строки по рангу в памяти.
+        '''
+        if self.request.method in SAFE_METHODS:
+            recipes = Recipe.objects.defer('search_vector')
+            if self.request.query_params.get('search'):
+                return recipes.prefetch_related('document')
+            return recipes.select_related('document')
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            'ingredients__ingredient',
+        )
+
     def get_serializer_class(self):
         '''Переопределение сериализатора для POST запроса.'''
         if self.request.method in SAFE_METHODS:
-            return RecipeSerializer
+            return RecipeReadSerializer
         return CreateRecipeSerializer
 
     def perform_create(self, serializer):
         '''Добавление автора рецепта, пользователя который сделал запрос.'''
         serializer.save(author=self.request.user)
 
-    @action(detail=False)
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        '''Новые рецепты авторов из подписок, по курсору ?cursor=.'''
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(
+            self.get_queryset(), request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
     def download_shopping_cart(self, request):
-        '''Метод для скачивания листа покупок.'''
-        shopping_cart = (IngredientInRecipe.objects.filter(
-            recipe__shopping_list__user=request.user).values(
-            'ingredient__name',
-            'ingredient__measurement_unit',).annotate(
-            amount=Sum('amount')).order_by()
-        )
-        buffer = io.BytesIO()
-        page = canvas.Canvas(buffer)
-        pdfmetrics.registerFont(TTFont('Vera', 'Vera.ttf'))
-        x_position, y_position = 50, 800
-        page.setFont("Vera", 24)
-        if shopping_cart:
-            page.drawString(x_position, y_position, 'Cписок покупок:')
-            page.setFont("Vera", 12)
-            indent = 20
-            for index, recipe in enumerate(shopping_cart, start=1):
-                page.drawString(
-                    x_position, y_position - indent,
-                    f'{index}. {recipe["ingredient__name"]} - '
-                    f'{recipe["amount"]} '
-                    f'{recipe["ingredient__measurement_unit"]}.')
-                y_position -= 15
-                if y_position <= 50:
-                    page.showPage()
-                    y_position = 800
-            page.save()
-            buffer.seek(0)
-            return FileResponse(buffer,
-                                as_attachment=True,
-                                filename='Shopping_cart.pdf')
-        page.drawString(
-            x_position,
-            y_position,
-            'Cписок покупок пуст!')
-        page.save()
-        buffer.seek(0)
-        return FileResponse(
-            buffer, as_attachment=True, filename='Shopping_cart.pdf')
+        '''Метод для скачивания листа покупок.
+
+        Формат выбирается параметром ?format= (pdf, txt, csv, json).
+        '''
+        format = request.query_params.get('format', DEFAULT_FORMAT)
+        if format not in EXPORTERS:
+            return Response(
+                f'Неизвестный формат! Доступны: {", ".join(EXPORTERS)}',
+                status=status.HTTP_400_BAD_REQUEST)
+        return export_shopping_cart(request, format)
+
+    @action(detail=False, methods=['post'],
+            permission_classes=(IsAuthenticated,))
+    def export_shopping_cart(self, request):
+        '''Фоновая выгрузка листа покупок.
+
+        Возвращает задачу, статус которой опрашивается в /api/jobs/{id}/,
+        а готовый файл скачивается по ссылке download.
+        '''
+        format = request.data.get(
+            'format', request.query_params.get('format', DEFAULT_FORMAT))
+        if format not in EXPORTERS:
+            return Response(
+                f'Неизвестный формат! Доступны: {", ".join(EXPORTERS)}',
+                status=status.HTTP_400_BAD_REQUEST)
+        job = enqueue('export_shopping_cart', user=request.user,
+                      format=format)
+        serializer = JobSerializer(job, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': request.build_absolute_uri(
+                            reverse('api:jobs-detail', args=(job.pk,)))})
+
+    @action(detail=False, permission_classes=(IsAdminUser,))
+    def shopping_cart_cache(self, request):
+        '''Статистика кэша документов списка покупок.'''
+        return Response(cache.get_stats())
 
 
 class Subscribe(generics.RetrieveDestroyAPIView, generics.ListCreateAPIView):
@@ -178,27 +243,157 @@ class Shopping_listViews(generics.RetrieveDestroyAPIView,
     def create(self, request, *args, **kwargs):
         '''Добавление в список покупок.'''
         recipe = self.get_object()
-        request.user.shopping_list.create(recipe=recipe)
+        if request.user.shopping_list.filter(recipe=recipe).exists():
+            return Response('Рецепт уже в списке покупок!',
+                            status=status.HTTP_400_BAD_REQUEST)
+        servings = ServingsSerializer(data=request.data)
+        servings.is_valid(raise_exception=True)
+        request.user.shopping_list.create(recipe=recipe,
+                                          **servings.validated_data)
         serializer = self.get_serializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def patch(self, request, *args, **kwargs):
+        '''Изменение множителя порций рецепта в списке покупок.'''
+        item = get_object_or_404(request.user.shopping_list,
+                                 recipe=self.get_object())
+        servings = ServingsSerializer(item, data=request.data)
+        servings.is_valid(raise_exception=True)
+        servings.save()
+        return Response({**self.get_serializer(item.recipe).data,
+                         **servings.data})
+
     def perform_destroy(self, instance):
         '''Удаление рецепта из листа покупок.'''
         self.request.user.shopping_list.filter(
             recipe=self.get_object()).delete()
 
 
+class BulkMembershipView(APIView):
+    '''Пакетное добавление и удаление рецептов или авторов пользователя.
+
+    Список передаётся в теле {"ids": [...]} или в параметре ?ids=1,2,3,
+    в ответе статус для каждого id.
+    '''
+
+    permission_classes = (IsAuthenticated,)
+    kind = None
+
+    @property
+    def model(self):
+        return membership.KINDS[self.kind][0]
+
+    def get_ids(self, request):
+        data = request.data
+        if 'ids' not in data and 'ids' in request.query_params:
+            data = {'ids': request.query_params['ids'].split(',')}
+        serializer = BulkIdsSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['ids']))
+
+    def get_response(self, results):
+        return Response({'results': [
+            {'id': pk, 'status': result} for pk, result in results.items()
+        ]})
+
+    def post(self, request):
+        return self.get_response(
+            bulk.add(self.model, request.user, self.get_ids(request)))
+
+    def delete(self, request):
+        return self.get_response(
+            bulk.remove(self.model, request.user, self.get_ids(request)))
+
+
+class BulkFavourites(BulkMembershipView):
+    '''Пакетное добавление и удаление рецептов в избранном.'''
+
+    kind = 'favourites'
+
+
+class BulkShopping_list(BulkMembershipView):
+    '''Пакетное добавление и удаление рецептов в списке покупок.'''
+
+    kind = 'shopping_list'
+
+    def get(self, request):
+        '''Сводный список покупок в JSON для отображения на странице.'''
+        return Response(list(shopping_cart_lines(
+            get_shopping_cart(request.user))))
+
+
+class BulkSubscribe(BulkMembershipView):
+    '''Пакетная подписка на авторов и отписка от них.'''
+
+    kind = 'follows'
+
+
+def recipe_previews_queryset(author_ids, limit=None):
+    '''Рецепты для превью подписок на авторов author_ids.
+
+    Номер рецепта внутри автора считается оконной функцией, поэтому
+    ограничение recipes_limit применяется в базе.
+    '''
+    recipes = Recipe.objects.filter(author__in=author_ids).only(
+        'id', 'name', 'image', 'renditions_image', 'cooking_time',
+        'author_id')
+    if limit is not None:
+        recipes = recipes.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author'),
+            order_by=(F('name').desc(), F('id').desc()),
+        )).filter(row_number__lte=limit)
+    return recipes
+
+
 class SubscriptionsViews(generics.ListAPIView):
     '''Вьюсет для отображения подписок пользователя'''
 
-    queryset = Follow.objects.all()
     serializer_class = SubscribeSerializer
     permission_classes = (IsAuthenticated,)
     pagination_class = PageNumberPagination
 
-    @action(detail=False, methods=['GET'])
-    def subscriptions(self, request):
-        '''Метод для отображения всех подписок пользователя.'''
-        follows = request.user.follower
-        serializer = SubscribeSerializer(follows, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        '''Подписки пользователя вместе с авторами.'''
+        return self.request.user.follower.select_related('author')
+
+    def get_recipe_previews(self, follows):
+        '''Превью рецептов всех авторов страницы одним запросом.'''
+        previews = defaultdict(list)
+        for recipe in recipe_previews_queryset(
+                [follow.author_id for follow in follows],
+                get_recipes_limit(self.request)):
+            previews[recipe.author_id].append(recipe)
+        return previews
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if hasattr(self, 'recipe_previews'):
+            context['recipes'] = self.recipe_previews
+        return context
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        self.recipe_previews = self.get_recipe_previews(page)
+        return page
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    '''Статус фоновых задач пользователя и их результаты.'''
+
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = PageNumberPagination
+
+    def get_queryset(self):
+        return self.request.user.jobs.all()
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        '''Файл результата выполненной задачи.'''
+        job = self.get_object()
+        if job.status != Job.DONE or not job.result:
+            return Response('Задача ещё не выполнена!',
+                            status=status.HTTP_409_CONFLICT)
+        return FileResponse(job.result.open('rb'), as_attachment=True,
+                            filename=os.path.basename(job.result.name))
@@ -0,0 +1,37 @@
+import asyncio
+import os
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
+os.environ['DEBUG_TOOLBAR'] = 'False'
+
+
+class ConcurrencyLimit:
+    '''Не больше limit одновременных HTTP-запросов в процессе.
+
+    Django выполняет каждый запрос в своём потоке со своим соединением с
+    базой, поэтому без ограничения сотни одновременных соединений клиентов
+    превращаются в сотни соединений с PostgreSQL и упираются в
+    max_connections. Остальные запросы ждут в цикле событий.
+    '''
+
+    def __init__(self, app, limit):
+        self.app = app
+        self.limit = limit
+        self.semaphore = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.limit)
+        async with self.semaphore:
+            await self.app(scope, receive, send)
+
+
+application = ConcurrencyLimit(get_asgi_application(),
+                               settings.ASGI_CONCURRENCY_LIMIT)
@@ -6,6 +6,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv('SECRET_KEY', '1234')
 
 DEBUG = True
+# Debug toolbar поддерживает только синхронные middleware: с ним Django
+# переводит всю цепочку ASGI в поток, и async-вьюхи теряют смысл.
+# foodgram/asgi.py его выключает.
+DEBUG_TOOLBAR = DEBUG and os.getenv('DEBUG_TOOLBAR', 'True') == 'True'
 
 AUTH_USER_MODEL = "users.User"
 
@@ -15,6 +19,7 @@ INSTALLED_APPS = [
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -26,12 +31,12 @@ INSTALLED_APPS = [
     'djoser',
     'django_filters',
     'import_export',
-    'debug_toolbar',
     'colorfield',
     'reportlab',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,9 +44,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
@@ -87,6 +95,86 @@ DATABASES = {
 }
 
 
+# Кэш ответов справочников и готовых документов списка покупок. LocMemCache
+# подходит только для одного процесса gunicorn; при нескольких воркерах
+# используйте FileBasedCache или django.core.cache.backends.redis.RedisCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    'shopping_cart': {
+        'BACKEND': os.getenv(
+            'SHOPPING_CART_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('SHOPPING_CART_CACHE_LOCATION', 'shopping_cart'),
+        'TIMEOUT': int(os.getenv('SHOPPING_CART_CACHE_TIMEOUT', 60 * 60 * 24)),
+    },
+}
+
+SHOPPING_CART_CACHE = 'shopping_cart'
+SHOPPING_CART_CACHE_MAX_SIZE = 5 * 1024 * 1024
+
+CATALOGUE_CACHE = 'default'
+MEMBERSHIP_CACHE = 'default'
+CATALOGUE_CACHE_MAX_AGE = int(os.getenv('CATALOGUE_CACHE_MAX_AGE', 60))
+
+# Как часто индекс ингредиентов в памяти перечитывает каталог, секунды.
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+# Поиск по рецептам вне PostgreSQL: время жизни индекса в памяти, секунды,
+# и наибольшее число найденных рецептов.
+RECIPE_SEARCH_INDEX_TTL = int(os.getenv('RECIPE_SEARCH_INDEX_TTL', 300))
+RECIPE_SEARCH_FALLBACK_LIMIT = 1000
+
+# Подбор рецептов по имеющимся ингредиентам: время жизни наборов в памяти,
+# секунды, и наибольшее число подобранных рецептов.
+RECIPE_INGREDIENT_SETS_TTL = int(os.getenv('RECIPE_INGREDIENT_SETS_TTL', 300))
+RECIPE_MATCH_LIMIT = 1000
+
+# Лента подписок: наибольшая длина ленты, число подписчиков, выше
+# которого рецепты автора не раскладываются по лентам, а подмешиваются
+# при чтении, и как часто, в среднем в раскладках, обрезается лента.
+FEED_MAX_LENGTH = 1000
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 5000))
+FEED_TRIM_INTERVAL = 20
+
+# Наибольшее число id в одном пакетном запросе к избранному, покупкам
+# и подпискам.
+BULK_MUTATION_LIMIT = 1000
+
+# Популярность рецептов: периоды полураспада веса события для порядков
+# popular и trending и задержка учёта событий, секунды.
+POPULARITY_HALF_LIFE = 30 * 24 * 60 * 60
+TRENDING_HALF_LIFE = 3 * 24 * 60 * 60
+POPULARITY_SETTLE_DELAY = 60
+
+# Async-вьюхи для чтения рецептов, справочников и подписок. Включаются
+# в foodgram/asgi.py; под WSGI остаются синхронные вьюхи DRF.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+# Одновременных запросов на процесс ASGI: каждый держит своё соединение
+# с базой, поэтому процессы * лимит должно быть меньше max_connections.
+ASGI_CONCURRENCY_LIMIT = int(os.getenv('ASGI_CONCURRENCY_LIMIT', 20))
+
+# Замеры запросов: доля запросов в выборке (0 — middleware отключена),
+# порог повторов одного SQL для предупреждения о N+1 и токен /metrics.
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 0))
+METRICS_N_PLUS_ONE_THRESHOLD = 10
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Фоновые задачи: процессов в воркере, попыток на задачу, через сколько
+# без продления блокировки задача захватывается повторно и как часто
+# воркер её продлевает, пауза опроса пустой очереди и время хранения
+# результатов, секунды.
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', 2))
+JOBS_MAX_ATTEMPTS = 3
+JOBS_LOCK_TIMEOUT = 2 * 60
+JOBS_HEARTBEAT_INTERVAL = 30
+JOBS_POLL_INTERVAL = 1
+JOBS_RESULT_TTL = 24 * 60 * 60
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -120,6 +208,15 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Фото рецептов: предельный размер загрузки, размеры уменьшенных копий
+# (по большей стороне) и число потоков, в которых они создаются.
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+RECIPE_IMAGE_RENDITIONS = {
+    'thumbnail': 300,
+    'medium': 800,
+}
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+
 CSRF_TRUSTED_ORIGINS = ["https://fgyapr.ddns.net"]
 
 REST_FRAMEWORK = {
@@ -134,6 +231,7 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+    'URL_FORMAT_OVERRIDE': None,
 }
 
 DJOSER = {
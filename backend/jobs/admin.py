@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'user', 'status', 'attempts',
+                    'created', 'finished')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('attempts', 'locked_until', 'error', 'created',
+                       'finished')
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,73 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.queue import claim, heartbeat, purge
+from jobs.worker import init_worker, run_job
+
+
+class Command(BaseCommand):
+    help = 'Воркер фоновых задач: захват из таблицы и выполнение в пуле.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.JOBS_WORKERS,
+            help='Число процессов в пуле.')
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, секунды.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить доступные задачи и завершиться.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        # Дочерние процессы запускаются заново, а не форкаются, чтобы не
+        # унаследовать соединение с базой родителя.
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker)
+        running = {}
+        done = failed = 0
+        purged_at = 0
+        heartbeat_at = time.monotonic()
+        started = time.monotonic()
+        with executor:
+            while True:
+                finished = [future for future in running if future.done()]
+                for future in finished:
+                    del running[future]
+                    if future.exception() is None and future.result():
+                        done += 1
+                    else:
+                        failed += 1
+                claimed = claim(workers - len(running))
+                for job_id in claimed:
+                    running[executor.submit(run_job, job_id)] = job_id
+                # Блокировка продлевается, пока задача выполняется, поэтому
+                # повторно захватываются только задачи упавших воркеров.
+                if (running and time.monotonic() - heartbeat_at
+                        > settings.JOBS_HEARTBEAT_INTERVAL):
+                    heartbeat(list(running.values()))
+                    heartbeat_at = time.monotonic()
+                if claimed:
+                    continue
+                if options['once'] and not running:
+                    break
+                if time.monotonic() - purged_at > settings.JOBS_RESULT_TTL:
+                    purge(timedelta(seconds=settings.JOBS_RESULT_TTL))
+                    purged_at = time.monotonic()
+                if running:
+                    wait(running, timeout=options['poll_interval'],
+                         return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(options['poll_interval'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Выполнено {done}, с ошибкой {failed} за {elapsed:.2f} с '
+            f'({done / elapsed if elapsed else 0:.1f} задач/с).')
@@ -0,0 +1,64 @@
+from django.db import models
+from django.utils import timezone
+
+from users.models import User
+
+
+MAX_LENGTH_LIMIT = 150
+
+
+class Job(models.Model):
+    '''Фоновая задача в очереди на базе таблицы.'''
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    kind = models.CharField('Тип задачи', max_length=MAX_LENGTH_LIMIT)
+    payload = models.JSONField('Параметры', default=dict, blank=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        verbose_name='Пользователь',
+        null=True,
+        blank=True
+    )
+    status = models.CharField('Статус',
+                              max_length=16,
+                              choices=STATUSES,
+                              default=QUEUED
+                              )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField('Наибольшее число попыток',
+                                               default=3
+                                               )
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    locked_until = models.DateTimeField('Занята до', null=True, blank=True)
+    result = models.FileField('Результат',
+                              upload_to='jobs/',
+                              null=True,
+                              blank=True
+                              )
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(fields=['status', 'run_after'],
+                         name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
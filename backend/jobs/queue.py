@@ -0,0 +1,122 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(kind):
+    '''Регистрация функции, выполняющей задачи типа kind.'''
+    def register(func):
+        TASKS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, user=None, **payload):
+    if kind not in TASKS:
+        raise ValueError(f'Неизвестный тип задачи: {kind}')
+    return Job.objects.create(kind=kind, user=user, payload=payload,
+                              max_attempts=settings.JOBS_MAX_ATTEMPTS)
+
+
+def abandoned(now):
+    '''Задачи упавших воркеров: блокировку давно не продлевали.'''
+    return Q(status=Job.RUNNING, locked_until__lt=now)
+
+
+def claimable(now):
+    '''Задачи в очереди и задачи упавших воркеров с оставшимися попытками.'''
+    return (Q(status=Job.QUEUED, run_after__lte=now)
+            | abandoned(now) & Q(attempts__lt=F('max_attempts')))
+
+
+def lock_until(now):
+    return now + timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+
+
+def fail_abandoned(now):
+    '''Задачи упавших воркеров без оставшихся попыток помечаются ошибкой.'''
+    return Job.objects.filter(
+        abandoned(now), attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_until=None, finished=now,
+        error='Воркер не завершил задачу за отведённые попытки')
+
+
+def heartbeat(job_ids):
+    '''Продление блокировки выполняющихся задач живым воркером.'''
+    now = timezone.now()
+    return Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(
+        locked_until=lock_until(now))
+
+
+def claim(limit):
+    '''Захват до limit задач.
+
+    Задача считается захваченной, только если условный UPDATE изменил
+    строку, поэтому несколько воркеров не возьмут одну задачу и без
+    SELECT ... FOR UPDATE, который есть не во всех базах.
+    '''
+    now = timezone.now()
+    fail_abandoned(now)
+    candidates = Job.objects.filter(claimable(now)).order_by('id')
+    claimed = []
+    for pk in candidates.values_list('pk', flat=True)[:limit * 2]:
+        updated = Job.objects.filter(claimable(now), pk=pk).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=lock_until(now),
+        )
+        if updated:
+            claimed.append(pk)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def execute(job_id):
+    '''Выполнение захваченной задачи с повтором при ошибке.
+
+    Повторы идут с экспоненциальной задержкой, после max_attempts
+    неудач задача помечается как ошибочная.
+    '''
+    job = Job.objects.select_related('user').get(pk=job_id)
+    if job.kind not in TASKS:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED, locked_until=None, finished=timezone.now(),
+            error=f'Неизвестный тип задачи: {job.kind}')
+        return False
+    try:
+        TASKS[job.kind](job)
+    except Exception as error:
+        logger.exception('Задача %s завершилась ошибкой', job)
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.QUEUED, locked_until=None, error=repr(error),
+                run_after=now + timedelta(seconds=2 ** job.attempts))
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.FAILED, locked_until=None, error=repr(error),
+                finished=now)
+        return False
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.DONE, locked_until=None, error='',
+        finished=timezone.now())
+    return True
+
+
+def purge(older_than):
+    '''Удаление завершённых задач старше older_than вместе с файлами.'''
+    jobs = Job.objects.filter(status__in=(Job.DONE, Job.FAILED),
+                              finished__lt=timezone.now() - older_than)
+    for job in jobs.exclude(result='').exclude(result=None).iterator():
+        job.result.delete(save=False)
+    return jobs.delete()[0]
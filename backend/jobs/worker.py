@@ -0,0 +1,16 @@
+import django
+from django.db import connections
+
+
+def init_worker():
+    '''Подготовка Django в дочернем процессе пула.'''
+    django.setup()
+
+
+def run_job(job_id):
+    from .queue import execute
+
+    try:
+        return execute(job_id)
+    finally:
+        connections.close_all()
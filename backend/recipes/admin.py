@@ -1,8 +1,10 @@
 from django.contrib import admin
+from import_export.admin import ImportExportModelAdmin
 
 from .models import (Favourites, Ingredient, IngredientInRecipe, Recipe,
                      Shopping_list, Tag)
 from .forms import IngredientForm
+from .resources import RecipeResource
 
 
 class IngredientInRecipeInLime(admin.TabularInline):
@@ -11,9 +13,10 @@ class IngredientInRecipeInLime(admin.TabularInline):
     formset = IngredientForm
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ImportExportModelAdmin):
+    resource_classes = (RecipeResource, )
     list_display = ('id', 'author', 'name', 'image',
-                    'text', 'cooking_time', 'get_followers_count')
+                    'text', 'cooking_time', 'favourites_count')
     empty_value_display = '-пусто-'
     search_fields = ('name', )
     list_filter = ('author', )
@@ -21,10 +24,6 @@ class RecipeAdmin(admin.ModelAdmin):
     ordering = ['name']
     inlines = (IngredientInRecipeInLime, )
 
-    @admin.display(description='Добавили в избранное')
-    def get_followers_count(self, obj):
-        return obj.favourites.count()
-
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'slug')
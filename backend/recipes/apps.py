@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     name = 'recipes'
     verbose_name = 'Управление рецептами'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
@@ -0,0 +1,76 @@
+from django.db import transaction
+from django.dispatch import Signal
+
+from users.models import Follow
+
+from .counters import COUNTERS_BY_SOURCE
+
+# Пакетные вставка и удаление не вызывают post_save и post_delete, поэтому
+# зависящие от них данные обновляются по этому сигналу: sender — модель
+# связи, user_id — пользователь, target_ids — id рецептов или авторов.
+memberships_changed = Signal()
+# Отправляется после загрузки справочника ингредиентов COPY или
+# bulk_create, если добавлены новые строки.
+ingredients_loaded = Signal()
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+
+def target_field(model):
+    return COUNTERS_BY_SOURCE[model].field
+
+
+def add(model, user, target_ids):
+    '''Добавление связей пользователя с target_ids за три запроса.
+
+    Возвращает статус для каждого id: added, exists, not_found или self.
+    '''
+    counter = COUNTERS_BY_SOURCE[model]
+    field = f'{counter.field}_id'
+    with transaction.atomic():
+        found = set(counter.target.objects.filter(
+            pk__in=target_ids).values_list('pk', flat=True))
+        existing = set(model.objects.filter(
+            user=user, **{f'{field}__in': found}).values_list(
+            field, flat=True))
+        results = {}
+        for pk in target_ids:
+            if pk not in found:
+                results[pk] = NOT_FOUND
+            elif model is Follow and pk == user.pk:
+                results[pk] = SELF
+            elif pk in existing:
+                results[pk] = EXISTS
+            else:
+                results[pk] = ADDED
+        added = [pk for pk, result in results.items() if result == ADDED]
+        if added:
+            model.objects.bulk_create(
+                [model(user=user, **{field: pk}) for pk in added],
+                ignore_conflicts=True)
+            memberships_changed.send(sender=model, user_id=user.pk,
+                                     target_ids=added)
+    return results
+
+
+def remove(model, user, target_ids):
+    '''Удаление связей пользователя с target_ids одним DELETE ... IN.
+
+    Возвращает статус для каждого id: removed или absent.
+    '''
+    field = f'{target_field(model)}_id'
+    with transaction.atomic():
+        rows = model.objects.filter(user=user, **{f'{field}__in': target_ids})
+        existing = set(rows.values_list(field, flat=True))
+        if existing:
+            # QuerySet.delete() при подписчиках post_delete удаляет по
+            # одной строке с сигналом на каждую.
+            rows._raw_delete(rows.db)
+            memberships_changed.send(sender=model, user_id=user.pk,
+                                     target_ids=sorted(existing))
+    return {pk: REMOVED if pk in existing else ABSENT for pk in target_ids}
@@ -0,0 +1,53 @@
+from collections import namedtuple
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Follow, User
+
+from .models import Favourites, Recipe, Shopping_list
+
+Counter = namedtuple('Counter', ('source', 'target', 'field', 'name'))
+
+COUNTERS = (
+    Counter(Favourites, Recipe, 'recipe', 'favourites_count'),
+    Counter(Shopping_list, Recipe, 'recipe', 'in_carts_count'),
+    Counter(Follow, User, 'author', 'followers_count'),
+    Counter(Recipe, User, 'author', 'recipes_count'),
+)
+COUNTERS_BY_SOURCE = {counter.source: counter for counter in COUNTERS}
+
+
+def change_counter(counter, target_id, delta):
+    '''Атомарное изменение счётчика через F() без чтения строки.'''
+    queryset = counter.target.objects.filter(pk=target_id)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{counter.name}__gte': -delta})
+    queryset.update(**{counter.name: F(counter.name) + delta})
+
+
+def actual_count(counter):
+    '''Подзапрос с фактическим значением счётчика для каждой строки.'''
+    return Coalesce(Subquery(
+        counter.source.objects.filter(**{counter.field: OuterRef('pk')})
+        .order_by().values(counter.field)
+        .annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def recount_rows(counter, target_ids):
+    '''Фактическое значение счётчика для строк target_ids.'''
+    counter.target.objects.filter(pk__in=target_ids).update(
+        **{counter.name: actual_count(counter)})
+
+
+def recount(counter, dry_run=False):
+    '''Исправление расхождений счётчика, возвращает число строк.'''
+    drifted = counter.target.objects.annotate(
+        actual=actual_count(counter)
+    ).exclude(**{counter.name: F('actual')})
+    if dry_run:
+        return drifted.count()
+    return counter.target.objects.filter(
+        pk__in=drifted.values('pk')
+    ).update(**{counter.name: actual_count(counter)})
@@ -0,0 +1,170 @@
+import random
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from jobs.queue import enqueue
+from users.models import Follow, User
+
+from .models import FeedEntry, Recipe
+
+BATCH_SIZE = 1000
+
+
+def batches(items, size=BATCH_SIZE):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def trim(user_ids):
+    '''Удаление записей сверх FEED_MAX_LENGTH в лентах user_ids.'''
+    extra = FeedEntry.objects.filter(user__in=user_ids).annotate(
+        position=Window(RowNumber(), partition_by=F('user'),
+                        order_by=F('recipe_id').desc()),
+    ).filter(position__gt=settings.FEED_MAX_LENGTH).values_list(
+        'pk', flat=True)
+    FeedEntry.objects.filter(pk__in=list(extra)).delete()
+
+
+def fan_out(recipe_ids):
+    '''Раскладка новых рецептов по лентам подписчиков автора.
+
+    Рецепты авторов с числом подписчиков больше FEED_FANOUT_LIMIT не
+    раскладываются, их подмешивает чтение ленты. Ленты обрезаются не на
+    каждой раскладке, а в среднем раз в FEED_TRIM_INTERVAL раскладок, так
+    что длина ленты может ненадолго превысить FEED_MAX_LENGTH.
+    '''
+    recipes = defaultdict(list)
+    for pk, author_id in Recipe.objects.filter(
+            pk__in=recipe_ids,
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).values_list('pk', 'author_id'):
+        recipes[author_id].append(pk)
+    if not recipes:
+        return
+    followers = Follow.objects.filter(author__in=recipes).values_list(
+        'user_id', 'author_id').order_by('user_id')
+    for batch in batches(followers.iterator(chunk_size=BATCH_SIZE)):
+        FeedEntry.objects.bulk_create((
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+            for user_id, author_id in batch
+            for recipe_id in recipes[author_id]
+        ), ignore_conflicts=True)
+        trim([user_id for user_id, _ in batch
+              if random.random() * settings.FEED_TRIM_INTERVAL < 1])
+
+
+def sync_follows(pairs):
+    '''Лента после подписки или отписки: пары (подписчик, автор).
+
+    Состояние берётся из базы, поэтому подписка и отписка в одной
+    транзакции ничего не меняют. Если после отписок у автора осталось не
+    больше FEED_FANOUT_LIMIT подписчиков, его рецепты раскладываются по
+    лентам фоновой задачей.
+    '''
+    followed = set(Follow.objects.filter(
+        user__in={user_id for user_id, _ in pairs},
+        author__in={author_id for _, author_id in pairs},
+    ).values_list('user_id', 'author_id'))
+    for user_id, author_id in pairs:
+        if (user_id, author_id) not in followed:
+            FeedEntry.objects.filter(user=user_id, author=author_id).delete()
+            continue
+        latest = Recipe.objects.filter(
+            author=author_id,
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+        ).order_by('-id').values_list('pk', flat=True)
+        FeedEntry.objects.bulk_create((
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+            for recipe_id in latest[:settings.FEED_MAX_LENGTH]
+        ), ignore_conflicts=True)
+    trim({user_id for user_id, author_id in pairs
+          if (user_id, author_id) in followed})
+    unfollowed = Counter(author_id for user_id, author_id in set(pairs)
+                         if (user_id, author_id) not in followed)
+    crossed = [
+        author_id for author_id, followers_count in User.objects.filter(
+            pk__in=unfollowed).values_list('pk', 'followers_count')
+        if followers_count <= settings.FEED_FANOUT_LIMIT
+        < followers_count + unfollowed[author_id]]
+    if crossed:
+        enqueue('backfill_feeds', authors=crossed)
+
+
+def backfill(author_ids):
+    '''Раскладка рецептов авторов, у которых подписчиков стало не больше
+    FEED_FANOUT_LIMIT.
+
+    До этого их рецепты подмешивало чтение ленты и в ленты они не
+    попадали. Раскладка может быть большой, поэтому идёт в фоновой
+    задаче.
+    '''
+    for author_id in User.objects.filter(
+            pk__in=author_ids,
+            followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).values_list('pk', flat=True):
+        latest = list(Recipe.objects.filter(author=author_id).order_by(
+            '-id').values_list('pk', flat=True)[:settings.FEED_MAX_LENGTH])
+        followers = Follow.objects.filter(author=author_id).values_list(
+            'user_id', flat=True).order_by('user_id')
+        for batch in batches(followers.iterator(chunk_size=BATCH_SIZE)):
+            FeedEntry.objects.bulk_create((
+                FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                          author_id=author_id)
+                for user_id in batch for recipe_id in latest
+            ), ignore_conflicts=True, batch_size=BATCH_SIZE)
+            trim(batch)
+
+
+def rebuild(user_ids):
+    '''Заполнение лент заново последними рецептами авторов из подписок.
+
+    Нужна после пакетной вставки подписок или рецептов, которая не
+    вызывает сигналы.
+    '''
+    for batch in batches(user_ids):
+        FeedEntry.objects.filter(user__in=batch).delete()
+        latest = Follow.objects.filter(
+            user__in=batch,
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+        ).annotate(
+            recipe_id=F('author__recipe'),
+            position=Window(RowNumber(), partition_by=F('user'),
+                            order_by=F('author__recipe').desc()),
+        ).filter(recipe_id__isnull=False,
+                 position__lte=settings.FEED_MAX_LENGTH)
+        FeedEntry.objects.bulk_create((
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+            for user_id, author_id, recipe_id in latest.values_list(
+                'user_id', 'author_id', 'recipe_id').iterator(
+                    chunk_size=BATCH_SIZE)
+        ), batch_size=BATCH_SIZE)
+
+
+def timeline(user, before=None, limit=None):
+    '''id рецептов ленты по убыванию, строго меньше before.
+
+    Разложенные записи читаются по индексу (user, recipe), рецепты
+    крупных авторов — по индексу (author, id), списки сливаются.
+    '''
+    entries = FeedEntry.objects.filter(user=user)
+    large = Recipe.objects.filter(author__in=user.follower.filter(
+        author__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values('author'))
+    if before is not None:
+        entries = entries.filter(recipe__lt=before)
+        large = large.filter(pk__lt=before)
+    ids = set(entries.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True)[:limit])
+    ids.update(large.order_by('-id').values_list('pk', flat=True)[:limit])
+    return sorted(ids, reverse=True)[:limit]
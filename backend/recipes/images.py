@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.db import connections
+from django.dispatch import Signal
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 64 * 1024
+RENDITIONS_DIR = 'renditions'
+RENDITION_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+# Отправляется из рабочего потока, когда копии изображения name готовы.
+renditions_ready = Signal()
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-image')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''Хранилище, в котором имя файла — хэш его содержимого.
+
+    Одинаковые загрузки сохраняются один раз, а имена вида temp_XXXX.png
+    больше не появляются. Имена копий уже получены из хэша оригинала и
+    сохраняются как есть.
+    '''
+
+    def get_available_name(self, name, max_length=None):
+        '''Вызывается только из FileSystemStorage._save, когда файл успела
+        создать параллельная загрузка того же содержимого. Новое имя не
+        подбирается: повтор с тем же именем зациклился бы.'''
+        raise FileExistsError(name)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, filename = os.path.split(name)
+        if os.path.basename(directory) != RENDITIONS_DIR:
+            extension = os.path.splitext(filename)[1].lower()
+            name = os.path.join(directory, content_hash(content) + extension)
+        if not self.exists(name):
+            try:
+                name = self._save(name, content)
+            except FileExistsError:
+                # Содержимое одинаково по построению имени.
+                if not self.exists(name):
+                    raise
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+
+def rendition_name(name, size, format):
+    '''Имя уменьшенной копии, вычисляемое из имени оригинала.'''
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, RENDITIONS_DIR, f'{stem}_{size}.{format}')
+
+
+def make_renditions(storage, name):
+    '''Уменьшенные копии оригинала во всех размерах и форматах.'''
+    targets = [rendition_name(name, size, format)
+               for size in settings.RECIPE_IMAGE_RENDITIONS.values()
+               for format in RENDITION_FORMATS]
+    if all(storage.exists(target) for target in targets):
+        return False
+    with storage.open(name) as file, Image.open(file) as original:
+        original.load()
+        for size in settings.RECIPE_IMAGE_RENDITIONS.values():
+            image = original.copy()
+            image.thumbnail((size, size))
+            for format, pillow_format in RENDITION_FORMATS.items():
+                target = rendition_name(name, size, format)
+                if storage.exists(target):
+                    continue
+                content = ContentFile(b'')
+                if pillow_format == 'JPEG' and image.mode != 'RGB':
+                    image.convert('RGB').save(content, pillow_format)
+                else:
+                    image.save(content, pillow_format)
+                storage.save(target, content)
+    return True
+
+
+def schedule_renditions(storage, name):
+    '''Генерация копий в пуле потоков, вне обработки запроса.
+
+    Сигнал отправляется и когда копии уже были: новый рецепт с тем же
+    фото тоже должен узнать, что они готовы.
+    '''
+    def run():
+        try:
+            make_renditions(storage, name)
+            renditions_ready.send(sender=storage.__class__, name=name)
+        except Exception:
+            logger.exception('Не удалось создать копии изображения %s', name)
+        finally:
+            connections.close_all()
+    return executor.submit(run)
+
+
+def rendition_urls(field_file, ready):
+    '''Ссылки на копии; пока копии не готовы, отдаётся оригинал.
+
+    Готовность хранится в базе, поэтому файлы не проверяются.
+    '''
+    if not field_file:
+        return None
+    storage = field_file.storage
+    return {
+        label: {
+            format: storage.url(
+                rendition_name(field_file.name, size, format) if ready
+                else field_file.name)
+            for format in RENDITION_FORMATS}
+        for label, size in settings.RECIPE_IMAGE_RENDITIONS.items()}
@@ -0,0 +1,122 @@
+import threading
+import time
+from array import array
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+
+from .models import IngredientInRecipe
+
+MATCH_ALL = 'all'
+MATCH_ANY = 'any'
+COVERAGE_PREFIX = 'coverage>='
+
+
+def parse_match(value):
+    '''Минимальная доля имеющихся ингредиентов рецепта для режима match.
+
+    all — все ингредиенты рецепта есть, any — есть хотя бы один,
+    coverage>=x — есть не меньше доли x. Для неизвестного значения
+    возвращается None.
+    '''
+    if value in (None, '', MATCH_ALL):
+        return 1.0
+    if value == MATCH_ANY:
+        return 0.0
+    if value.startswith(COVERAGE_PREFIX):
+        try:
+            coverage = float(value[len(COVERAGE_PREFIX):])
+        except ValueError:
+            return None
+        if 0 <= coverage <= 1:
+            return coverage
+    return None
+
+
+class IngredientSetIndex:
+    '''Наборы ингредиентов рецептов в памяти процесса.
+
+    Для каждого рецепта хранится отсортированный массив id ингредиентов,
+    для каждого ингредиента — массив рецептов с ним: на миллионе рецептов
+    множества целых занимали бы в памяти в разы больше. Кандидаты берутся
+    из объединения множеств по имеющимся ингредиентам, после чего для них
+    считается покрытие без обращения к базе. Рецепты обновляются по одному
+    при изменении их ингредиентов в этом процессе, а целиком индекс
+    перестраивается по истечении RECIPE_INGREDIENT_SETS_TTL.
+    '''
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._recipes = None
+        self._postings = None
+        self._built_at = 0
+
+    def is_expired(self):
+        return (time.monotonic() - self._built_at
+                > settings.RECIPE_INGREDIENT_SETS_TTL)
+
+    def load(self, items):
+        sets = defaultdict(list)
+        for recipe_id, ingredient_id in items.values_list(
+                'recipe_id', 'ingredient_id').iterator():
+            sets[recipe_id].append(ingredient_id)
+        return sets
+
+    def add(self, recipe_id, ingredient_ids):
+        self._recipes[recipe_id] = array('I', sorted(set(ingredient_ids)))
+        for ingredient_id in self._recipes[recipe_id]:
+            self._postings[ingredient_id].append(recipe_id)
+
+    def remove(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            postings = self._postings[ingredient_id]
+            postings.remove(recipe_id)
+            if not postings:
+                del self._postings[ingredient_id]
+
+    def build(self):
+        with self._lock:
+            self._recipes = {}
+            self._postings = defaultdict(partial(array, 'I'))
+            sets = self.load(IngredientInRecipe.objects.all())
+            # Списки освобождаются по мере переноса в массивы.
+            while sets:
+                self.add(*sets.popitem())
+            self._built_at = time.monotonic()
+
+    def update(self, recipe_ids):
+        '''Перечитывание наборов изменённых рецептов.'''
+        if self._recipes is None:
+            return
+        sets = self.load(
+            IngredientInRecipe.objects.filter(recipe_id__in=recipe_ids))
+        with self._lock:
+            if self._recipes is None:
+                return
+            for recipe_id in recipe_ids:
+                self.remove(recipe_id)
+                if recipe_id in sets:
+                    self.add(recipe_id, sets[recipe_id])
+
+    def match(self, have, min_coverage, limit=None):
+        '''Id рецептов с покрытием не ниже порога, по убыванию покрытия.'''
+        have = set(have)
+        with self._lock:
+            if self._recipes is None or self.is_expired():
+                self.build()
+            candidates = set()
+            for ingredient_id in have:
+                candidates.update(self._postings.get(ingredient_id, ()))
+            coverages = {}
+            for recipe_id in candidates:
+                ingredient_ids = self._recipes[recipe_id]
+                found = sum(1 for pk in ingredient_ids if pk in have)
+                coverage = found / len(ingredient_ids)
+                if coverage >= min_coverage:
+                    coverages[recipe_id] = coverage
+        result = sorted(coverages, key=lambda pk: (-coverages[pk], -pk))
+        return result[:limit] if limit is not None else result
+
+
+ingredient_sets = IngredientSetIndex()
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import enqueue
+from recipes import popularity
+
+
+class Command(BaseCommand):
+    help = ('Учёт новых событий избранного и покупок в популярности '
+            'рецептов; запускается по расписанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать оценки заново по всем событиям.')
+        parser.add_argument(
+            '--queue', action='store_true',
+            help='Поставить пересчёт в очередь фоновых задач.')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            job = enqueue('fold_popularity', full=options['full'])
+            self.stdout.write(f'Пересчёт поставлен в очередь: задача {job.pk}')
+            return
+        started = time.monotonic()
+        total = popularity.fold(full=options['full'])
+        self.stdout.write(f'Учтено событий {total} за '
+                          f'{time.monotonic() - started:.2f} с.')
@@ -0,0 +1,165 @@
+import random
+import time
+import uuid
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import feed
+from recipes.counters import COUNTERS, recount
+from recipes.models import (Favourites, Ingredient, IngredientInRecipe,
+                            Recipe, Shopping_list, Tag)
+from recipes.search import reindex
+from users.models import Follow, User
+
+WORDS = (
+    'суп', 'салат', 'пирог', 'каша', 'соус', 'запеканка', 'рагу', 'паста',
+    'курица', 'говядина', 'рыба', 'грибы', 'сыр', 'томаты', 'картофель',
+    'лук', 'морковь', 'чеснок', 'зелень', 'сливки', 'тесто', 'ягоды',
+    'домашний', 'быстрый', 'острый', 'нежный', 'печёный', 'летний',
+)
+UNITS = ('г', 'мл', 'шт')
+PASSWORD = 'synthetic-password'
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def phrase(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+class Command(BaseCommand):
+    help = 'Генерация синтетических данных заданного объёма.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--ingredients', type=int, default=500,
+            help='Сколько ингредиентов должно быть в каталоге; '
+                 'недостающие создаются.')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--favourites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора, одинаковое зерно даёт одинаковые данные.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Префикс зависит от зерна: данные с разными зёрнами уживаются в
+        # одной базе.
+        self.prefix = uuid.UUID(int=self.rng.getrandbits(128)).hex[:8]
+        started = time.monotonic()
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            tags = self.create_tags(options['tags'])
+            ingredients = self.ensure_ingredients(options['ingredients'])
+            recipes = self.create_recipes(options['recipes'], users)
+            self.link_tags(recipes, tags, options['tags_per_recipe'])
+            self.link_ingredients(
+                recipes, ingredients, options['ingredients_per_recipe'])
+            self.link_users(Follow, 'author', users, users,
+                            options['follows_per_user'])
+            self.link_users(Favourites, 'recipe', users, recipes,
+                            options['favourites_per_user'])
+            self.link_users(Shopping_list, 'recipe', users, recipes,
+                            options['cart_per_user'])
+        self.refresh_derived(users, recipes)
+        self.stdout.write(
+            f'Создано пользователей {len(users)}, рецептов {len(recipes)} '
+            f'за {time.monotonic() - started:.2f} с, префикс {self.prefix}.')
+
+    def bulk_create(self, model, objects, **kwargs):
+        created = []
+        for batch in batches(objects, self.batch_size):
+            created.extend(model.objects.bulk_create(batch, **kwargs))
+        return created
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        return self.bulk_create(User, (
+            User(username=f'{self.prefix}_user{number}',
+                 email=f'{self.prefix}_user{number}@example.com',
+                 first_name=f'Имя{number}', last_name=f'Фамилия{number}',
+                 password=password)
+            for number in range(count)))
+
+    def create_tags(self, count):
+        return self.bulk_create(Tag, (
+            Tag(name=f'Тег {number}', slug=f'{self.prefix}_tag{number}',
+                color='#{:06x}'.format(self.rng.getrandbits(24)))
+            for number in range(count)))
+
+    def ensure_ingredients(self, count):
+        missing = count - Ingredient.objects.count()
+        if missing > 0:
+            self.bulk_create(Ingredient, (
+                Ingredient(name=f'{phrase(self.rng, 2)} {self.prefix}{n}',
+                           measurement_unit=self.rng.choice(UNITS))
+                for n in range(missing)))
+        return list(Ingredient.objects.values_list('pk', flat=True)[:count])
+
+    def create_recipes(self, count, users):
+        return self.bulk_create(Recipe, (
+            Recipe(author=self.rng.choice(users),
+                   name=phrase(self.rng, 3).capitalize(),
+                   text=phrase(self.rng, 40),
+                   cooking_time=self.rng.randint(5, 240))
+            for _ in range(count)))
+
+    def sample(self, population, count):
+        return self.rng.sample(population, min(count, len(population)))
+
+    def link_tags(self, recipes, tags, per_recipe):
+        through = Recipe.tags.through
+        self.bulk_create(through, (
+            through(recipe_id=recipe.pk, tag_id=tag.pk)
+            for recipe in recipes
+            for tag in self.sample(tags, per_recipe)))
+
+    def link_ingredients(self, recipes, ingredients, per_recipe):
+        self.bulk_create(IngredientInRecipe, (
+            IngredientInRecipe(recipe_id=recipe.pk, ingredient_id=ingredient,
+                               amount=self.rng.randint(1, 1000))
+            for recipe in recipes
+            for ingredient in self.sample(ingredients, per_recipe)))
+
+    def link_users(self, model, field, users, targets, per_user):
+        self.bulk_create(model, (
+            model(user_id=user.pk, **{f'{field}_id': target.pk})
+            for user in users
+            for target in self.sample(targets, per_user)
+            if not (model is Follow and target.pk == user.pk)
+        ), ignore_conflicts=True)
+
+    def refresh_derived(self, users, recipes):
+        '''Пакетная вставка не вызывает сигналы, поэтому производные
+        данные — счётчики, поисковые векторы, документы и ленты —
+        обновляются отдельно.'''
+        for counter in COUNTERS:
+            with transaction.atomic():
+                recount(counter)
+        for batch in batches((recipe.pk for recipe in recipes),
+                             self.batch_size):
+            reindex(batch)
+        call_command('rebuild_recipe_documents',
+                     batch_size=self.batch_size, stdout=self.stdout)
+        for batch in batches((user.pk for user in users), self.batch_size):
+            with transaction.atomic():
+                feed.rebuild(batch)
@@ -1,18 +1,144 @@
+import csv
+import io
 import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from recipes.bulk import ingredients_loaded
 from recipes.models import Ingredient
 
+DEFAULT_PATH = (settings.BASE_DIR / 'recipes' / 'management' / 'commands'
+                / 'data' / 'ingredients.json')
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    '''Строки CSV вида «название,единица измерения».'''
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    '''Потоковый разбор JSON-массива объектов без загрузки файла целиком.'''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив ингредиентов.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Некорректный JSON.')
+                break
+            yield item['name'], item['measurement_unit']
+        if not chunk:
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
 
 class Command(BaseCommand):
+    help = 'Загрузка каталога ингредиентов из JSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=[DEFAULT_PATH],
+            help='Файлы с ингредиентами, .json или .csv.')
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файлов, по умолчанию определяется по расширению.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число строк в одном запросе.')
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY на PostgreSQL.')
 
     def handle(self, *args, **options):
-        with open(
-            'recipes/management/commands/data/ingredients.json', 'rb'
-        ) as f:
-            data = json.load(f)
-            for item in data:
-                Ingredient.objects.create(
-                    name=item['name'],
-                    measurement_unit=item['measurement_unit'])
+        use_copy = (not options['no_copy']
+                    and connection.vendor == 'postgresql')
+        write_batch = self.copy_batch if use_copy else self.insert_batch
+        total = 0
+        before = Ingredient.objects.count()
+        started = time.monotonic()
+        for path in map(Path, options['paths']):
+            format = options['format'] or path.suffix.lstrip('.').lower()
+            if format not in READERS:
+                raise CommandError(f'Неизвестный формат файла: {path}')
+            with open(path, encoding='utf-8', newline='') as file:
+                for batch in batches(READERS[format](file),
+                                     options['batch_size']):
+                    with transaction.atomic():
+                        write_batch(batch)
+                    total += len(batch)
+        elapsed = time.monotonic() - started
+        inserted = Ingredient.objects.count() - before
+        if inserted:
+            # COPY и bulk_create не вызывают post_save: кэш справочника и
+            # индекс ингредиентов сбрасываются по сигналу.
+            ingredients_loaded.send(sender=Ingredient)
+        self.stdout.write(
+            f'Прочитано {total}, добавлено {inserted}, '
+            f'пропущено {total - inserted} за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else 0:.0f} строк/с).')
+
+    def insert_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch),
+            ignore_conflicts=True)
+
+    def copy_batch(self, batch):
+        '''COPY во временную таблицу и вставка без конфликтующих строк.'''
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE IF NOT EXISTS ingredient_load '
+                '(name text, measurement_unit text) ON COMMIT DELETE ROWS')
+            # Внутри внешней транзакции ON COMMIT не срабатывает между
+            # пачками, и без очистки каждая пачка вставлялась бы заново.
+            cursor.execute('TRUNCATE ingredient_load')
+            cursor.copy_expert(
+                'COPY ingredient_load (name, measurement_unit) '
+                'FROM STDIN WITH CSV', buffer)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit FROM ingredient_load '
+                'ON CONFLICT DO NOTHING')
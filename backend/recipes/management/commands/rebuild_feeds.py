@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import feed
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Заполнение лент подписок заново по текущим подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=feed.BATCH_SIZE,
+            help='Число пользователей в одной пачке.')
+
+    def handle(self, *args, **options):
+        user_ids = Follow.objects.order_by('user').values_list(
+            'user', flat=True).distinct()
+        started = time.monotonic()
+        total = 0
+        for batch in feed.batches(user_ids.iterator(), options['batch_size']):
+            with transaction.atomic():
+                feed.rebuild(batch)
+            total += len(batch)
+        self.stdout.write(f'Пересобрано {total} лент за '
+                          f'{time.monotonic() - started:.2f} с.')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobs.queue import enqueue
+from recipes.counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков избранного, покупок, подписчиков и рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений, ничего не исправляя.')
+        parser.add_argument(
+            '--queue', action='store_true',
+            help='Поставить пересчёт в очередь фоновых задач.')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            job = enqueue('recount', dry_run=options['dry_run'])
+            self.stdout.write(f'Пересчёт поставлен в очередь: задача {job.pk}')
+            return
+        for counter in COUNTERS:
+            with transaction.atomic():
+                drifted = recount(counter, dry_run=options['dry_run'])
+            self.stdout.write(
+                f'{counter.target.__name__}.{counter.name}: '
+                f'расхождений {drifted}')
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+COUNTERS = (
+    ('recipes', 'Favourites', 'recipes', 'Recipe', 'recipe',
+     'favourites_count'),
+    ('recipes', 'Shopping_list', 'recipes', 'Recipe', 'recipe',
+     'in_carts_count'),
+    ('users', 'Follow', 'users', 'User', 'author', 'followers_count'),
+    ('recipes', 'Recipe', 'users', 'User', 'author', 'recipes_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for (source_app, source, target_app, target,
+         field, name) in COUNTERS:
+        source = apps.get_model(source_app, source)
+        target = apps.get_model(target_app, target)
+        target.objects.update(**{name: Coalesce(Subquery(
+            source.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field)
+            .annotate(count=Count('pk')).values('count')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredientinrecipe',
+            options={'verbose_name': 'Ингридиент в рецепте', 'verbose_name_plural': 'Ингридиенты в рецепте'},
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favourites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавили в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавили в список покупок'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(default=None, null=True, upload_to='recipe/', verbose_name='Фото рецепта'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:03
+
+from django.db import migrations, models
+import recipes.images
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(default=None, null=True, storage=recipes.images.ContentAddressedStorage(), upload_to='recipe/', verbose_name='Фото рецепта'),
+        ),
+    ]
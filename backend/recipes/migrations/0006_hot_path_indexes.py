@@ -0,0 +1,79 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:04
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+USER_RECIPE_MODELS = (
+    ('Favourites', 'favourites_count'),
+    ('Shopping_list', 'in_carts_count'),
+)
+
+
+def remove_duplicates(apps, schema_editor):
+    '''Удаление повторных записей пользователь–рецепт, кроме первой.'''
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for model_name, counter in USER_RECIPE_MODELS:
+        model = apps.get_model('recipes', model_name)
+        duplicates = (model.objects.values('user', 'recipe').order_by()
+                      .annotate(first_id=Min('id'), count=Count('id'))
+                      .filter(count__gt=1))
+        for duplicate in duplicates.iterator():
+            model.objects.filter(
+                user=duplicate['user'], recipe=duplicate['recipe']
+            ).exclude(id=duplicate['first_id']).delete()
+        Recipe.objects.update(**{counter: Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk'))
+            .order_by().values('recipe')
+            .annotate(count=Count('pk')).values('count')
+        ), 0)})
+
+
+TRIGRAM_INDEX_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+)
+
+
+def create_trigram_index(apps, schema_editor):
+    '''Триграммный индекс для поиска по вхождению, только PostgreSQL.'''
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in TRIGRAM_INDEX_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS ingredient_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-name', '-id'], name='recipe_author_name_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favourites',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='recipes_favourites_unique_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shopping_list',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='recipes_shopping_list_unique_user_recipe'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:09
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = (
+    "UPDATE recipes_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(ingredient.name, ' ') "
+    "FROM recipes_ingredientinrecipe AS item "
+    "JOIN recipes_ingredient AS ingredient "
+    "ON ingredient.id = item.ingredient_id "
+    "WHERE item.recipe_id = recipes_recipe.id), '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'C')",
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+
+
+def create_search_index(apps, schema_editor):
+    '''Заполнение поисковых векторов и GIN-индекс, только PostgreSQL.'''
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in SEARCH_VECTOR_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityWatermark',
+            fields=[
+                ('source', models.CharField(max_length=150, primary_key=True, serialize=False, verbose_name='Источник')),
+                ('folded_until', models.DateTimeField(verbose_name='События учтены до')),
+            ],
+            options={
+                'verbose_name': 'Отметка учёта популярности',
+                'verbose_name_plural': 'Отметки учёта популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='favourites',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата публикации'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность за последние дни'),
+        ),
+        migrations.AddField(
+            model_name='shopping_list',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='favourites',
+            index=models.Index(fields=['created'], name='favourites_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending', '-id'], name='recipe_trending_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopping_list',
+            index=models.Index(fields=['created'], name='shopping_list_created_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:47
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopping_list',
+            name='servings',
+            field=models.DecimalField(decimal_places=2, default=1, max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0.1'), message='Минимум 0.1 порции'), django.core.validators.MaxValueValidator(100, message='Максимум 100 порций')], verbose_name='Множитель порций'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.3 on 2026-10-18 05:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+from recipes.images import (RENDITION_FORMATS, ContentAddressedStorage,
+                            rendition_name)
+
+
+def mark_ready_renditions(apps, schema_editor):
+    '''Отметка фото, копии которых уже созданы. Имена содержательные,
+    поэтому файлы проверяются один раз на фото, а не на рецепт.'''
+    Recipe = apps.get_model('recipes', 'Recipe')
+    storage = ContentAddressedStorage()
+    names = Recipe.objects.exclude(image='').exclude(
+        image__isnull=True).values_list('image', flat=True).distinct()
+    for name in names.iterator():
+        if all(storage.exists(rendition_name(name, size, format))
+               for size in settings.RECIPE_IMAGE_RENDITIONS.values()
+               for format in RENDITION_FORMATS):
+            Recipe.objects.filter(image=name).update(renditions_image=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_shopping_list_servings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_image',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Фото, для которого готовы копии'),
+        ),
+        migrations.RunPython(mark_ready_renditions,
+                             migrations.RunPython.noop),
+    ]
@@ -1,9 +1,14 @@
+from decimal import Decimal
+
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.db.models import UniqueConstraint
 from django.core import validators
 
-from users.models import User
+from users.models import DerivedFieldsMixin, User
+
+from .images import ContentAddressedStorage
 
 
 MAX_LENGTH_LIMIT = 150
@@ -49,12 +54,16 @@ class Ingredient(models.Model):
             UniqueConstraint(fields=['name', 'measurement_unit'],
                              name='unique_ingredient_unit')
         ]
+        indexes = [
+            models.Index(fields=['name'], name='ingredient_name_prefix_idx',
+                         opclasses=['varchar_pattern_ops'])
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(DerivedFieldsMixin, models.Model):
     '''Рецепты.'''
 
     author = models.ForeignKey(
@@ -68,9 +77,15 @@ class Recipe(models.Model):
                             )
     image = models.ImageField('Фото рецепта',
                               upload_to='recipe/',
+                              storage=ContentAddressedStorage(),
                               null=True,
                               default=None
                               )
+    renditions_image = models.CharField('Фото, для которого готовы копии',
+                                        max_length=100,
+                                        blank=True,
+                                        editable=False
+                                        )
     text = models.TextField('Описание рецепта')
     tags = models.ManyToManyField(Tag,
                                   verbose_name='Теги'
@@ -81,15 +96,53 @@ class Recipe(models.Model):
             validators.MinValueValidator(1, message='Минимум 1 минута'),
             validators.MaxValueValidator(720, message='Максимум 720 минут')]
     )
+    favourites_count = models.PositiveIntegerField('Добавили в избранное',
+                                                   default=0,
+                                                   editable=False
+                                                   )
+    in_carts_count = models.PositiveIntegerField('Добавили в список покупок',
+                                                 default=0,
+                                                 editable=False
+                                                 )
+    search_vector = SearchVectorField(null=True, editable=False)
+    created = models.DateTimeField('Дата публикации',
+                                   auto_now_add=True
+                                   )
+    popularity = models.FloatField('Популярность',
+                                   default=0,
+                                   editable=False
+                                   )
+    trending = models.FloatField('Популярность за последние дни',
+                                 default=0,
+                                 editable=False
+                                 )
+
+    derived_fields = ('favourites_count', 'in_carts_count', 'popularity',
+                      'trending', 'renditions_image')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-name',)
+        ordering = ('-name', '-id')
+        indexes = [
+            models.Index(fields=['-popularity', '-id'],
+                         name='recipe_popularity_id_idx'),
+            models.Index(fields=['-trending', '-id'],
+                         name='recipe_trending_id_idx'),
+            models.Index(fields=['-name', '-id'], name='recipe_name_id_idx'),
+            models.Index(fields=['author', '-name', '-id'],
+                         name='recipe_author_name_id_idx'),
+            models.Index(fields=['author', '-id'],
+                         name='recipe_author_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def renditions_are_ready(self):
+        return bool(self.image) and self.renditions_image == self.image.name
+
 
 class IngredientInRecipe(models.Model):
     """Буферная модель для связи моделей ингридиента и рецепта."""
@@ -146,15 +199,26 @@ class Model_user_recipe(models.Model):
         verbose_name='Рецепт в избранном',
         related_name='%(class)s'
     )
+    created = models.DateTimeField('Дата добавления',
+                                   auto_now_add=True
+                                   )
 
     class Meta:
         abstract = True
+        constraints = [
+            UniqueConstraint(fields=['user', 'recipe'],
+                             name='%(app_label)s_%(class)s_unique_user_recipe')
+        ]
+        indexes = [
+            models.Index(fields=['created'],
+                         name='%(class)s_created_idx')
+        ]
 
 
 class Favourites(Model_user_recipe):
     """Модель Избранного"""
 
-    class Meta:
+    class Meta(Model_user_recipe.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
 
@@ -165,9 +229,97 @@ class Favourites(Model_user_recipe):
 class Shopping_list(Model_user_recipe):
     """Модель листа покупок"""
 
-    class Meta:
+    servings = models.DecimalField(
+        'Множитель порций',
+        max_digits=5,
+        decimal_places=2,
+        default=1,
+        validators=[
+            validators.MinValueValidator(
+                Decimal('0.1'), message='Минимум 0.1 порции'),
+            validators.MaxValueValidator(
+                100, message='Максимум 100 порций')]
+    )
+
+    class Meta(Model_user_recipe.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
 
     def __str__(self):
         return f'Список покупок пользователя {self.user}'
+
+
+class RecipeDocument(models.Model):
+    '''Готовое представление рецепта без полей, зависящих от пользователя.'''
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт'
+    )
+    data = models.JSONField('Документ')
+    updated = models.DateTimeField('Обновлён', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return f'Документ рецепта {self.recipe_id}'
+
+
+class FeedEntry(models.Model):
+    '''Рецепт в ленте подписчика, раскладывается при публикации.'''
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            UniqueConstraint(fields=['user', 'recipe'],
+                             name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class PopularityWatermark(models.Model):
+    '''До какого момента события источника учтены в популярности.'''
+
+    source = models.CharField('Источник',
+                              max_length=MAX_LENGTH_LIMIT,
+                              primary_key=True
+                              )
+    folded_until = models.DateTimeField('События учтены до')
+
+    class Meta:
+        verbose_name = 'Отметка учёта популярности'
+        verbose_name_plural = 'Отметки учёта популярности'
+
+    def __str__(self):
+        return f'{self.source}: {self.folded_until}'
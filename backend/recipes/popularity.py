@@ -0,0 +1,101 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Favourites, PopularityWatermark, Recipe, Shopping_list
+
+# Оценки хранятся как log2 суммы весов событий, умноженных на
+# 2 ** ((момент - EPOCH) / период полураспада). Затухание со временем
+# одинаково для всех рецептов, поэтому порядок по такой оценке совпадает
+# с порядком по затухшей к текущему моменту, а старые строки не нужно
+# переписывать.
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+SOURCES = {
+    'favourites': (Favourites, 1.0),
+    'shopping_list': (Shopping_list, 0.5),
+}
+BATCH_SIZE = 1000
+
+
+def half_lives():
+    return {
+        'popularity': settings.POPULARITY_HALF_LIFE,
+        'trending': settings.TRENDING_HALF_LIFE,
+    }
+
+
+def log_add(first, second):
+    '''log2(2 ** first + 2 ** second) без переполнения.'''
+    high, low = max(first, second), min(first, second)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def collect(events, weight, scores):
+    '''Добавление событий в оценки, возвращает число событий.
+
+    События группируются в базе по рецепту и часу, так что затухание
+    считается с точностью до часа.
+    '''
+    total = 0
+    periods = half_lives().items()
+    hourly = events.annotate(hour=TruncHour('created')).order_by().values(
+        'recipe_id', 'hour').annotate(count=Count('pk')).values_list(
+        'recipe_id', 'hour', 'count')
+    for recipe_id, hour, count in hourly.iterator(chunk_size=BATCH_SIZE):
+        total += count
+        age = (hour - EPOCH).total_seconds()
+        for name, half_life in periods:
+            scores[recipe_id][name] = log_add(
+                scores[recipe_id][name],
+                math.log2(weight * count) + age / half_life)
+    return total
+
+
+def apply(scores):
+    '''Сложение накопленных оценок с сохранёнными, пачками.'''
+    fields = list(half_lives())
+    recipe_ids = sorted(scores)
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        recipes = list(Recipe.objects.filter(
+            pk__in=recipe_ids[start:start + BATCH_SIZE]).only(*fields))
+        for recipe in recipes:
+            for field in fields:
+                setattr(recipe, field, log_add(
+                    getattr(recipe, field), scores[recipe.pk][field]))
+        Recipe.objects.bulk_update(recipes, fields)
+
+
+def fold(full=False):
+    '''Учёт новых событий избранного и покупок в оценках рецептов.
+
+    Обрабатываются события до момента на POPULARITY_SETTLE_DELAY секунд
+    раньше текущего, чтобы не пропустить строки из ещё не завершённых
+    транзакций. При full оценки считаются заново по всем событиям,
+    это нужно и для учёта удалений. Возвращает число учтённых событий.
+    '''
+    until = timezone.now() - timedelta(
+        seconds=settings.POPULARITY_SETTLE_DELAY)
+    scores = defaultdict(lambda: dict.fromkeys(half_lives(), -math.inf))
+    total = 0
+    with transaction.atomic():
+        if full:
+            Recipe.objects.update(**dict.fromkeys(half_lives(), 0))
+        for source, (model, weight) in SOURCES.items():
+            mark, _ = (PopularityWatermark.objects.select_for_update()
+                       .get_or_create(source=source,
+                                      defaults={'folded_until': EPOCH}))
+            events = model.objects.filter(created__lte=until)
+            if not full:
+                events = events.filter(created__gt=mark.folded_until)
+            total += collect(events, weight, scores)
+            mark.folded_until = until
+            mark.save(update_fields=['folded_until'])
+        apply(scores)
+    return total
@@ -0,0 +1,84 @@
+import json
+
+from import_export import fields, resources, widgets
+
+from users.models import User
+
+from .models import Ingredient, IngredientInRecipe, Recipe, Tag
+
+COLUMNS = ('id', 'name', 'author', 'text', 'cooking_time', 'image', 'tags',
+           'ingredients')
+TAGS_SEPARATOR = ','
+
+
+def ingredient_rows(recipe):
+    '''Ингредиенты рецепта списком [название, единица, количество].'''
+    return [[item.ingredient.name, item.ingredient.measurement_unit,
+             item.amount] for item in recipe.ingredients.all()]
+
+
+def recipe_record(recipe):
+    '''Рецепт со связями в виде словаря для JSON Lines.
+
+    Автор указывается email, теги — slug, ингредиенты — названием и
+    единицей измерения, так что запись не зависит от id в базе.
+    '''
+    return {
+        'id': recipe.pk,
+        'name': recipe.name,
+        'author': recipe.author.email,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'image': recipe.image.name or None,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': ingredient_rows(recipe),
+    }
+
+
+def parse_csv_row(row):
+    '''Строка CSV из RecipeResource в словарь как в JSON Lines.'''
+    return {
+        **row,
+        'image': row.get('image') or None,
+        'tags': [slug for slug in row.get('tags', '').split(TAGS_SEPARATOR)
+                 if slug],
+        'ingredients': json.loads(row.get('ingredients') or '[]'),
+    }
+
+
+class RecipeResource(resources.ModelResource):
+    '''Импорт и экспорт рецептов с тегами и ингредиентами.'''
+
+    author = fields.Field(
+        attribute='author', column_name='author',
+        widget=widgets.ForeignKeyWidget(User, field='email'))
+    tags = fields.Field(
+        attribute='tags', column_name='tags',
+        widget=widgets.ManyToManyWidget(Tag, field='slug',
+                                        separator=TAGS_SEPARATOR))
+    ingredients = fields.Field(column_name='ingredients')
+
+    class Meta:
+        model = Recipe
+        fields = COLUMNS
+        export_order = COLUMNS
+
+    def get_queryset(self):
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'ingredients__ingredient')
+
+    def dehydrate_ingredients(self, recipe):
+        return json.dumps(ingredient_rows(recipe), ensure_ascii=False)
+
+    def save_m2m(self, obj, data, using_transactions, dry_run):
+        '''Теги сохраняет import_export, ингредиенты заменяются целиком.'''
+        super().save_m2m(obj, data, using_transactions, dry_run)
+        if (not using_transactions and dry_run) or (
+                'ingredients' not in data):
+            return
+        obj.ingredients.all().delete()
+        for name, unit, amount in json.loads(data['ingredients'] or '[]'):
+            ingredient, _ = Ingredient.objects.get_or_create(
+                name=name, measurement_unit=unit)
+            IngredientInRecipe.objects.create(
+                recipe=obj, ingredient=ingredient, amount=amount)
@@ -0,0 +1,220 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import (Case, F, Func, IntegerField, OuterRef,
+                              Subquery, Value, When)
+
+from .models import IngredientInRecipe, Recipe
+
+SEARCH_CONFIG = 'russian'
+# Веса полей как у ts_rank по умолчанию: A — название, B — ингредиенты,
+# C — описание.
+WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+TOKEN_RE = re.compile(r'\w+')
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией',
+    'ой', 'ей', 'ый', 'ий', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ом', 'ем',
+    'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ую', 'юю', 'а', 'я', 'о', 'е',
+    'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+
+def use_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def stem(word):
+    '''Упрощённое отсечение окончаний для индекса в памяти.'''
+    for ending in ENDINGS:
+        if (word.endswith(ending)
+                and len(word) - len(ending) >= MIN_STEM_LENGTH):
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    return [stem(token) for token in
+            TOKEN_RE.findall(text.casefold().replace('ё', 'е'))]
+
+
+def search_vector():
+    '''Поисковый вектор рецепта: название, ингредиенты и описание.'''
+    from django.contrib.postgres.aggregates import StringAgg
+
+    ingredient_names = (
+        IngredientInRecipe.objects.filter(recipe=OuterRef('pk'))
+        .order_by().values('recipe')
+        .annotate(names=StringAgg('ingredient__name', delimiter=' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Subquery(ingredient_names), weight='B',
+                       config=SEARCH_CONFIG)
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+class RecipeSearchIndex:
+    '''Обратный индекс рецептов в памяти процесса.
+
+    Используется вместо полнотекстового поиска PostgreSQL на других базах.
+    Для каждого терма хранится вес в каждом рецепте, термы запроса
+    раскрываются по префиксу через отсортированный словарь. Индекс
+    обновляется по отдельным рецептам при их изменении в этом процессе и
+    перестраивается целиком по истечении RECIPE_SEARCH_INDEX_TTL.
+    '''
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = None
+        self._documents = None
+        self._vocabulary = None
+        self._built_at = 0
+
+    def is_expired(self):
+        return (time.monotonic() - self._built_at
+                > settings.RECIPE_SEARCH_INDEX_TTL)
+
+    def load(self, recipes):
+        '''Термы с весами для рецептов из queryset.'''
+        documents = defaultdict(lambda: defaultdict(float))
+        for recipe in recipes.values('id', 'name', 'text').iterator():
+            terms = documents[recipe['id']]
+            for field in ('name', 'text'):
+                for token in tokenize(recipe[field]):
+                    terms[token] += WEIGHTS[field]
+        ingredients = IngredientInRecipe.objects.filter(
+            recipe__in=recipes.values('id')
+        ).values_list('recipe_id', 'ingredient__name')
+        for recipe_id, name in ingredients.iterator():
+            if recipe_id in documents:
+                for token in tokenize(name):
+                    documents[recipe_id][token] += WEIGHTS['ingredients']
+        return documents
+
+    def add(self, recipe_id, terms):
+        self._documents[recipe_id] = tuple(terms)
+        for token, weight in terms.items():
+            if token not in self._postings:
+                self._vocabulary = None
+            self._postings[token][recipe_id] = weight
+
+    def remove(self, recipe_id):
+        for token in self._documents.pop(recipe_id, ()):
+            postings = self._postings[token]
+            postings.pop(recipe_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary = None
+
+    def build(self):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            self._vocabulary = None
+            for recipe_id, terms in self.load(Recipe.objects.all()).items():
+                self.add(recipe_id, terms)
+            self._built_at = time.monotonic()
+
+    def update(self, recipe_ids):
+        '''Переиндексация рецептов; удалённые просто убираются.'''
+        if self._postings is None:
+            return
+        documents = self.load(Recipe.objects.filter(pk__in=recipe_ids))
+        with self._lock:
+            if self._postings is None:
+                return
+            for recipe_id in recipe_ids:
+                self.remove(recipe_id)
+                if recipe_id in documents:
+                    self.add(recipe_id, documents[recipe_id])
+
+    def get_vocabulary(self):
+        vocabulary = self._vocabulary
+        if vocabulary is None:
+            vocabulary = self._vocabulary = sorted(self._postings)
+        return vocabulary
+
+    def search(self, query, limit=None):
+        '''Id рецептов, содержащих все термы запроса, по убыванию веса.'''
+        with self._lock:
+            if self._postings is None or self.is_expired():
+                self.build()
+            vocabulary = self.get_vocabulary()
+            scores = None
+            for term in set(tokenize(query)):
+                matches = defaultdict(float)
+                position = bisect_left(vocabulary, term)
+                while (position < len(vocabulary)
+                       and vocabulary[position].startswith(term)):
+                    postings = self._postings[vocabulary[position]]
+                    for recipe_id, weight in postings.items():
+                        matches[recipe_id] += weight
+                    position += 1
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {recipe_id: score + matches[recipe_id]
+                              for recipe_id, score in scores.items()
+                              if recipe_id in matches}
+                if not scores:
+                    return []
+        if scores is None:
+            return []
+        result = sorted(scores, key=lambda pk: (-scores[pk], -pk))
+        return result[:limit] if limit is not None else result
+
+
+recipe_index = RecipeSearchIndex()
+
+
+def reindex(recipe_ids):
+    '''Обновление поискового индекса для изменённых рецептов.'''
+    if use_postgres():
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=search_vector())
+    else:
+        recipe_index.update(recipe_ids)
+
+
+def filter_in_order(queryset, recipe_ids):
+    '''Рецепты из списка id в порядке этого списка.
+
+    На PostgreSQL позиция берётся через array_position с одним
+    параметром-массивом: CASE с ветвью на каждый id из тысячи собирается
+    в SQL дольше, чем выполняется сам запрос.
+    '''
+    if not recipe_ids:
+        return queryset.none()
+    if use_postgres():
+        rank = Func(Value(recipe_ids, output_field=ArrayField(IntegerField())),
+                    F('pk'), function='array_position',
+                    output_field=IntegerField())
+    else:
+        rank = Case(*(When(pk=pk, then=Value(position))
+                      for position, pk in enumerate(recipe_ids)),
+                    output_field=IntegerField())
+    return queryset.filter(pk__in=recipe_ids).annotate(
+        rank=rank).order_by('rank')
+
+
+def search_recipes(queryset, query):
+    '''Рецепты, подходящие под запрос, от наиболее релевантных.'''
+    if use_postgres():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG,
+                                   search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-id')
+    return filter_in_order(queryset, recipe_index.search(
+        query, limit=settings.RECIPE_SEARCH_FALLBACK_LIMIT))
@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Follow
+
+from . import feed
+from .bulk import memberships_changed
+from .counters import COUNTERS_BY_SOURCE, change_counter, recount_rows
+from .images import renditions_ready, schedule_renditions
+from .ingredient_sets import ingredient_sets
+from .models import Favourites, IngredientInRecipe, Recipe, Shopping_list
+from .search import reindex
+from .transactions import on_commit_batched
+
+
+def update_counter(sender, instance, delta):
+    counter = COUNTERS_BY_SOURCE[sender]
+    change_counter(counter, getattr(instance, f'{counter.field}_id'), delta)
+
+
+@receiver(post_save, sender=Favourites)
+@receiver(post_save, sender=Shopping_list)
+@receiver(post_save, sender=Follow)
+@receiver(post_save, sender=Recipe)
+def counted_object_created(sender, instance, created, **kwargs):
+    if created:
+        update_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favourites)
+@receiver(post_delete, sender=Shopping_list)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=Recipe)
+def counted_object_deleted(sender, instance, **kwargs):
+    update_counter(sender, instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    if instance.image and not instance.renditions_are_ready:
+        storage, name = instance.image.storage, instance.image.name
+        transaction.on_commit(lambda: schedule_renditions(storage, name))
+
+
+@receiver(renditions_ready)
+def recipe_renditions_ready(sender, name, **kwargs):
+    '''Отметка о готовых копиях. Приложение recipes стоит в INSTALLED_APPS
+    раньше api, поэтому отметка появляется до пересборки документов.'''
+    Recipe.objects.filter(image=name).exclude(
+        renditions_image=name).update(renditions_image=name)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def recipe_search_changed(sender, instance, **kwargs):
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    on_commit_batched(reindex, [recipe_id])
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    on_commit_batched(ingredient_sets.update, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        on_commit_batched(feed.fan_out, [instance.pk])
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    on_commit_batched(feed.sync_follows,
+                      [(instance.user_id, instance.author_id)])
+
+
+@receiver(memberships_changed)
+def memberships_changed_in_bulk(sender, user_id, target_ids, **kwargs):
+    recount_rows(COUNTERS_BY_SOURCE[sender], target_ids)
+    if sender is Follow:
+        on_commit_batched(feed.sync_follows,
+                          [(user_id, author_id) for author_id in target_ids])
@@ -0,0 +1,26 @@
+from django.db import transaction
+
+from jobs.queue import task
+
+from . import feed, popularity
+from .counters import COUNTERS, recount
+
+
+@task('recount')
+def recount_counters(job):
+    '''Пересчёт счётчиков в фоне, как команда recount.'''
+    for counter in COUNTERS:
+        with transaction.atomic():
+            recount(counter, dry_run=job.payload.get('dry_run', False))
+
+
+@task('fold_popularity')
+def fold_popularity(job):
+    '''Учёт новых событий в популярности, как команда fold_popularity.'''
+    popularity.fold(full=job.payload.get('full', False))
+
+
+@task('backfill_feeds')
+def backfill_feeds(job):
+    '''Раскладка рецептов авторов, ушедших ниже FEED_FANOUT_LIMIT.'''
+    feed.backfill(job.payload['authors'])
@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models import QuerySet
+
+
+class BatchedCallback:
+    '''Вызов func после коммита со всеми id, накопленными в транзакции.
+
+    Querysets вычисляются только при вызове, то есть уже после коммита.
+    '''
+
+    def __init__(self, func):
+        self.func = func
+        self.ids = set()
+        self.querysets = []
+        self.called = False
+
+    def add(self, ids):
+        if isinstance(ids, QuerySet):
+            self.querysets.append(ids)
+        else:
+            self.ids.update(ids)
+
+    def __call__(self):
+        self.called = True
+        ids = set(self.ids)
+        for queryset in self.querysets:
+            ids.update(queryset)
+        if ids:
+            self.func(sorted(ids))
+
+
+def on_commit_batched(func, ids, using=None):
+    '''Как transaction.on_commit, но один вызов func на транзакцию.
+
+    Сигналы приходят на каждую строку, и без объединения изменение
+    рецепта с десятком ингредиентов пересобирало бы его десяток раз.
+    '''
+    connection = transaction.get_connection(using)
+    for entry in connection.run_on_commit:
+        callback = entry[1]
+        # Выполненный вызов остаётся в списке, например в
+        # captureOnCommitCallbacks, и новые id в него уже не попадут.
+        if (isinstance(callback, BatchedCallback) and callback.func == func
+                and not callback.called):
+            callback.add(ids)
+            return
+    callback = BatchedCallback(func)
+    callback.add(ids)
+    transaction.on_commit(callback, using=using)
@@ -0,0 +1,50 @@
+from django.db.models import Case, CharField, F, FloatField, Value, When
+
+# Совместимые единицы: единица -> (базовая единица, множитель к базовой).
+UNITS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'ч. л.': ('ч. л.', 1),
+    'ст. л.': ('ч. л.', 3),
+}
+# Единицы вывода для базовой единицы, от крупной к мелкой.
+DISPLAY_UNITS = {
+    'г': (('кг', 1000), ('г', 1)),
+    'мл': (('л', 1000), ('мл', 1)),
+    'ч. л.': (('ст. л.', 3), ('ч. л.', 1)),
+}
+PRECISION = 3
+
+
+def base_unit(field):
+    '''SQL-выражение: базовая единица для единицы из поля field.'''
+    return Case(
+        *(When(**{field: unit}, then=Value(base))
+          for unit, (base, _) in UNITS.items()),
+        default=F(field),
+        output_field=CharField(),
+    )
+
+
+def base_factor(field):
+    '''SQL-выражение: множитель перевода в базовую единицу.'''
+    return Case(
+        *(When(**{field: unit}, then=Value(float(factor)))
+          for unit, (_, factor) in UNITS.items()),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+
+
+def humanize(amount, unit):
+    '''Количество в самой крупной единице, где оно не меньше одной и
+    целое или с половиной: 1.5 кг, но 1250 г и 4 ч. л.'''
+    for display, factor in DISPLAY_UNITS.get(unit, ()):
+        halves = round(amount * 2 / factor, PRECISION)
+        if amount >= factor and halves == int(halves):
+            amount, unit = amount / factor, display
+            break
+    amount = round(amount, PRECISION)
+    return (int(amount) if amount == int(amount) else amount), unit
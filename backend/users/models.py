@@ -6,7 +6,28 @@ from django.db.models import UniqueConstraint
 MAX_LENGTH_LIMIT = 150
 
 
-class User(AbstractUser):
+class DerivedFieldsMixin:
+    '''Поля derived_fields меняются только запросами update().
+
+    save() существующей строки записывает остальные поля, поэтому
+    устаревший экземпляр, например из формы админки или PATCH, не
+    затирает счётчики, изменённые параллельными запросами.
+    '''
+
+    derived_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.derived_fields]
+        super().save(*args, **kwargs)
+
+
+class User(DerivedFieldsMixin, AbstractUser):
     """Кастомная модель пользователей."""
 
     first_name = models.CharField('Имя',
@@ -20,6 +41,16 @@ class User(AbstractUser):
                               blank=False,
                               unique=True
                               )
+    followers_count = models.PositiveIntegerField('Количество подписчиков',
+                                                  default=0,
+                                                  editable=False
+                                                  )
+    recipes_count = models.PositiveIntegerField('Количество рецептов',
+                                                default=0,
+                                                editable=False
+                                                )
+
+    derived_fields = ('followers_count', 'recipes_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
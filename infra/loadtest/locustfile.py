@@ -0,0 +1,64 @@
+'''Нагрузка на чтение для сравнения WSGI и ASGI.
+
+Каждый пользователь Locust держит одно соединение и шлёт запросы без
+пауз, поэтому --users задаёт число одновременных соединений. С
+LOADTEST_TOKEN запросы идут от имени пользователя с этим токеном.
+'''
+import os
+import random
+
+import requests
+from locust import FastHttpUser, constant, events, task
+
+PAGES = 50
+RECIPE_IDS = 1000
+recipe_ids = []
+
+
+@events.test_start.add_listener
+def load_recipe_ids(environment, **kwargs):
+    '''Id рецептов для запросов к карточкам, один раз на запуск.
+
+    Страницы берутся курсором по ссылке next: только в этом режиме
+    ?limit= задаёт размер страницы.
+    '''
+    url = f'{environment.host}/api/recipes/?cursor=&limit=100'
+    while url and len(recipe_ids) < RECIPE_IDS:
+        response = requests.get(url)
+        response.raise_for_status()
+        page = response.json()
+        recipe_ids.extend(recipe['id'] for recipe in page['results'])
+        url = page['next']
+
+
+class Reader(FastHttpUser):
+    wait_time = constant(0)
+
+    def on_start(self):
+        token = os.getenv('LOADTEST_TOKEN')
+        self.headers = {'Authorization': f'Token {token}'} if token else {}
+
+    def get(self, url, name=None):
+        self.client.get(url, name=name, headers=self.headers)
+
+    @task(4)
+    def recipe_list(self):
+        self.get('/api/recipes/')
+
+    @task(2)
+    def recipe_page(self):
+        self.get(f'/api/recipes/?page={random.randint(2, PAGES)}',
+                 name='/api/recipes/?page=[n]')
+
+    @task(4)
+    def recipe_detail(self):
+        self.get(f'/api/recipes/{random.choice(recipe_ids)}/',
+                 name='/api/recipes/[id]/')
+
+    @task(1)
+    def tags(self):
+        self.get('/api/tags/')
+
+    @task(1)
+    def ingredients(self):
+        self.get('/api/ingredients/')